@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -71,6 +72,20 @@ DATABASES = {
     }
 }
 
+# PostgreSQL when POSTGRES_DB is set, needed to run several bot / order queue processes against one database
+if os.environ.get('POSTGRES_DB'):
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ['POSTGRES_DB'],
+        'USER': os.environ.get('POSTGRES_USER', 'postgres'),
+        'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+        'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+        'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        # keep connections open between bot cycles instead of reconnecting for every request
+        'CONN_MAX_AGE': int(os.environ.get('POSTGRES_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -112,3 +127,79 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Exchange API clients are pooled per credentials to reuse HTTP keep-alive connections
+
+EXCHANGE_CLIENT_POOL_MAX_SIZE = 32
+
+EXCHANGE_CLIENT_POOL_IDLE_TIMEOUT = 300
+
+# Seconds between two checks of a process's market cache against the markets table, picking up market syncs
+# run by other processes
+
+MARKET_CACHE_CHECK_INTERVAL = 5
+
+# Concurrent order submission, the rate limit is a token bucket per account
+
+ORDER_SUBMISSION_MAX_WORKERS = 8
+
+ORDER_SUBMISSION_RATE_PER_ACCOUNT = 5
+
+ORDER_SUBMISSION_BURST_PER_ACCOUNT = 10
+
+# Failed submissions with a retryable error are resubmitted after an exponential backoff in seconds
+
+ORDER_RETRY_BASE_DELAY = 2
+
+ORDER_RETRY_MAX_DELAY = 300
+
+ORDER_RETRY_MAX_ATTEMPTS = 8
+
+# Parallel order cancellation; with ORDER_CANCELLATION_CANCEL_ALL an account and market whose every open bot
+# order is cancelled takes one cancel-all request, which also cancels orders placed on it outside the bots, so
+# only turn it on for accounts used by the bots alone
+
+ORDER_CANCELLATION_MAX_WORKERS = 16
+
+ORDER_CANCELLATION_CANCEL_ALL = False
+
+# Terminal orders last updated more than ORDER_ARCHIVE_AFTER_DAYS ago are moved with their trades to gzip CSV
+# files partitioned by month under ORDER_ARCHIVE_DIR (BASE_DIR / "archive" when unset) by archive_orders
+
+ORDER_ARCHIVE_DIR = None
+
+ORDER_ARCHIVE_AFTER_DAYS = 30
+
+# Exchange request budgets as (weight per second, burst), shared by every process of this host through lock
+# files in EXCHANGE_RATE_LIMIT_DIR; new orders leave EXCHANGE_RATE_LIMIT_RESERVE of the burst to cancels and
+# status checks
+
+TABDEAL_RATE_LIMIT_PER_ACCOUNT = (10, 20)
+
+TABDEAL_RATE_LIMIT_PER_IP = (20, 60)
+
+EXCHANGE_RATE_LIMIT_DIR = None
+
+EXCHANGE_RATE_LIMIT_RESERVE = 0.25
+
+# Bearer tokens accepted by the read API under /api/, besides staff sessions
+
+API_TOKENS = [token for token in os.environ.get('API_TOKENS', '').split(',') if token]
+
+# Addresses and networks allowed to scrape /metrics, from the web app without a staff session and from the
+# listeners run_bots and run_order_queue open with --metrics-port
+
+METRICS_ALLOWED_IPS = ["127.0.0.1", "::1"]
+
+# Websocket endpoint for price and order updates, point it at the local stream server to test offline
+
+TABDEAL_STREAM_URL = "wss://api1.tabdeal.org/stream/"
+
+# Fee charged per fill as a fraction of its quote value, recorded on trades and bot summaries
+
+EXCHANGE_FEE_RATE = "0.001"
+
+# Extra exchange providers as {id: (name, dotted path of the BaseExchangeInterFace implementation)}, on top of
+# the built-in Tabdeal (1) and Simulator (2); a provider's module is imported the first time it is used
+
+EXCHANGE_PROVIDERS = {}
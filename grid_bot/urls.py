@@ -1,6 +1,13 @@
 from django.contrib import admin
 from django.urls import path
 
+from trading_bot import views as trading_bot_views
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', trading_bot_views.metrics, name="metrics"),
+    path('api/bots', trading_bot_views.bots, name="api-bots"),
+    path('api/bots/<int:bot_id>', trading_bot_views.bot, name="api-bot"),
+    path('api/orders', trading_bot_views.open_orders, name="api-open-orders"),
+    path('api/fills', trading_bot_views.fills, name="api-fills"),
 ]
@@ -1,11 +1,21 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.utils import timezone
 
 from trading_bot import models as trading_bot_models
+from trading_bot.exchange_registry import exchange_providers
+from trading_bot.order_cancellation import OrderCanceller
+from trading_bot.order_submission import OrderSubmitter
 
 
 class ExchangeAdmin(admin.ModelAdmin):
     list_display = [field.name for field in trading_bot_models.Exchange._meta.fields]
 
+    def formfield_for_dbfield(self, db_field, request, **kwargs):
+        if db_field.name == "exchange_provider":
+            return forms.TypedChoiceField(choices=exchange_providers.choices(), coerce=int)
+        return super().formfield_for_dbfield(db_field, request, **kwargs)
+
 
 class CurrencyAdmin(admin.ModelAdmin):
     list_display = [field.name for field in trading_bot_models.Currency._meta.fields]
@@ -17,11 +27,18 @@ class MarketAdmin(admin.ModelAdmin):
 
 class GridBotAdmin(admin.ModelAdmin):
     list_display = [field.name for field in trading_bot_models.GridBot._meta.fields]
-    actions = ['create_orders_for_bots']
+    actions = ['create_orders_for_bots', 'deactivate_bots']
 
     def create_orders_for_bots(self, request, queryset):
+        # around the market's last price, never the middle of the range
         for bot in queryset:
-            bot.create_orders()
+            try:
+                bot.create_orders()
+            except ValueError as error:
+                self.message_user(request, str(error), level=messages.ERROR)
+
+    def deactivate_bots(self, request, queryset):
+        OrderCanceller().deactivate(queryset)
 
 
 class OrderAdmin(admin.ModelAdmin):
@@ -29,12 +46,27 @@ class OrderAdmin(admin.ModelAdmin):
     actions = ["submit_order", "update_order_state"]
 
     def submit_order(self, request, queryset):
-        for order in queryset:
-            order.submit_order()
+        OrderSubmitter().submit(queryset)
 
     def update_order_state(self, request, queryset):
-        for order in queryset:
-            order.update_order_state()
+        trading_bot_models.Order.update_orders_state(queryset)
+
+
+class OrderRetryAdmin(admin.ModelAdmin):
+    list_display = [field.name for field in trading_bot_models.OrderRetry._meta.fields]
+    list_filter = ["error_code"]
+    actions = ["retry_now"]
+
+    def retry_now(self, request, queryset):
+        queryset.update(next_attempt_at=timezone.now())
+
+
+class TradeAdmin(admin.ModelAdmin):
+    list_display = [field.name for field in trading_bot_models.Trade._meta.fields]
+
+
+class GridBotSummaryAdmin(admin.ModelAdmin):
+    list_display = [field.name for field in trading_bot_models.GridBotSummary._meta.fields]
 
 
 class AccountAdmin(admin.ModelAdmin):
@@ -47,3 +79,6 @@ admin.site.register(trading_bot_models.Market, MarketAdmin)
 admin.site.register(trading_bot_models.GridBot, GridBotAdmin)
 admin.site.register(trading_bot_models.Account, AccountAdmin)
 admin.site.register(trading_bot_models.Order, OrderAdmin)
+admin.site.register(trading_bot_models.OrderRetry, OrderRetryAdmin)
+admin.site.register(trading_bot_models.Trade, TradeAdmin)
+admin.site.register(trading_bot_models.GridBotSummary, GridBotSummaryAdmin)
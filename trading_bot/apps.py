@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class TradingBotConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'trading_bot'
+
+    def ready(self):
+        from trading_bot import market_cache  # noqa: F401 registers the cache invalidation receivers
+        from trading_bot.client_pool import client_pool_gauges
+        from trading_bot.metrics import metrics
+
+        metrics.register_gauges(client_pool_gauges)
@@ -0,0 +1,175 @@
+import bisect
+import csv
+import math
+import struct
+import time
+from decimal import Decimal
+from typing import Iterable, Iterator, NamedTuple
+
+from trading_bot import models as trading_bot_models
+from trading_bot.grid_planner import GridPlanner
+
+# int64 timestamp followed by open, high, low, close and volume as float64
+BINARY_CANDLE = struct.Struct("<q5d")
+
+
+class Candle(NamedTuple):
+    timestamp: int
+    open: float
+    high: float
+    low: float
+    close: float
+
+
+def read_csv_candles(path: str) -> Iterator[Candle]:
+    """
+    Streams candles from a CSV file with ``timestamp,open,high,low,close[,volume]`` rows.
+    Rows with only ``timestamp,price`` are read as ticks. A header row is skipped.
+    """
+    with open(path, newline="") as candles_file:
+        for row in csv.reader(candles_file):
+            if not row:
+                continue
+            try:
+                timestamp = int(float(row[0]))
+            except ValueError:
+                continue
+            if len(row) < 5:
+                price = float(row[1])
+                yield Candle(timestamp, price, price, price, price)
+            else:
+                yield Candle(timestamp, float(row[1]), float(row[2]), float(row[3]), float(row[4]))
+
+
+def read_binary_candles(path: str, chunk_records: int = 4096) -> Iterator[Candle]:
+    chunk_size = BINARY_CANDLE.size * chunk_records
+    with open(path, "rb") as candles_file:
+        while True:
+            chunk = candles_file.read(chunk_size)
+            if not chunk:
+                break
+            usable = len(chunk) - len(chunk) % BINARY_CANDLE.size
+            for timestamp, open_price, high, low, close, _ in BINARY_CANDLE.iter_unpack(chunk[:usable]):
+                yield Candle(timestamp, open_price, high, low, close)
+
+
+def read_candles(path: str) -> Iterator[Candle]:
+    if path.endswith(".csv"):
+        return read_csv_candles(path)
+    return read_binary_candles(path)
+
+
+def write_binary_candles(path: str, candles: Iterable[Candle]):
+    with open(path, "wb") as candles_file:
+        for candle in candles:
+            candles_file.write(BINARY_CANDLE.pack(candle.timestamp, candle.open, candle.high, candle.low,
+                                                  candle.close, 0.0))
+
+
+class GridBacktest:
+    """
+    Replays candles against a grid run the way ``GridBot`` runs it: the opening orders come
+    from ``GridPlanner.plan`` at the first open, every fill is rolled into a
+    ``GridBotSummary`` with ``apply_trade`` and gets its counter order from
+    ``GridPlanner.counter_levels``, as in ``GridBot.handle_fills``. Within a candle the price
+    is assumed to travel open, low, high, close on up candles and open, high, low, close on
+    down candles.
+
+    Open orders are kept in two sorted price lists and the best buy and sell are cached as
+    floats, so a candle that fills nothing costs a few float comparisons.
+    """
+
+    def __init__(self, planner: GridPlanner, investment: Decimal, fee_rate: float = 0.0):
+        self.planner = planner
+        self.investment = Decimal(str(investment))
+        self.fee_rate = Decimal(str(fee_rate))
+
+    def run(self, candles: Iterable[Candle]) -> dict:
+        started = time.perf_counter()
+        candles = iter(candles)
+        first_candle = next(candles, None)
+        if first_candle is None:
+            raise ValueError("no candles to backtest")
+
+        buy_side = trading_bot_models.Order.Side.Buy.value
+        sell_side = trading_bot_models.Order.Side.Sell.value
+        orders = {level.price: level for level in
+                  self.planner.plan(current_price=Decimal(repr(first_candle.open)), buy_side=buy_side)}
+        occupied_prices = set(orders)
+        buy_prices = sorted(orders)
+        sell_prices = []
+        summary = trading_bot_models.GridBotSummary()
+        fee_rate = self.fee_rate
+        investment = float(self.investment)
+        quote, position = investment, 0.0
+        buy_fills = sell_fills = 0
+        peak_equity = investment
+        max_drawdown = 0.0
+        candles_count = 0
+        last_close = first_candle.open
+
+        def fill(level):
+            nonlocal quote, position, buy_fills, sell_fills
+            summary.apply_trade(level.side, level.price, level.amount, level.price * level.amount * fee_rate)
+            if level.side == buy_side:
+                buy_fills += 1
+            else:
+                sell_fills += 1
+            quote = investment + float(summary.quote_position)
+            position = float(summary.base_position)
+            for counter_level in self.planner.counter_levels([(level.side, level.price, level.amount)],
+                                                             occupied_prices, buy_side=buy_side, sell_side=sell_side):
+                orders[counter_level.price] = counter_level
+                bisect.insort(buy_prices if counter_level.side == buy_side else sell_prices, counter_level.price)
+
+        def move_to(price):
+            top_buy = float(buy_prices[-1]) if buy_prices else -math.inf
+            bottom_sell = float(sell_prices[0]) if sell_prices else math.inf
+            while price <= top_buy or price >= bottom_sell:
+                order_price = buy_prices.pop() if price <= top_buy else sell_prices.pop(0)
+                occupied_prices.discard(order_price)
+                fill(orders.pop(order_price))
+                top_buy = float(buy_prices[-1]) if buy_prices else -math.inf
+                bottom_sell = float(sell_prices[0]) if sell_prices else math.inf
+
+        for candle in self._chain(first_candle, candles):
+            move_to(candle.open)
+            if candle.close >= candle.open:
+                move_to(candle.low)
+                move_to(candle.high)
+            else:
+                move_to(candle.high)
+                move_to(candle.low)
+            move_to(candle.close)
+            last_close = candle.close
+            candles_count += 1
+
+            equity = quote + position * last_close
+            if equity > peak_equity:
+                peak_equity = equity
+            elif peak_equity - equity > max_drawdown:
+                max_drawdown = peak_equity - equity
+
+        elapsed = time.perf_counter() - started
+        final_equity = quote + position * last_close
+        return {
+            "candles": candles_count,
+            "grid_levels": len(set(self.planner.price_ticks(include_upper=True))),
+            "buy_fills": buy_fills,
+            "sell_fills": sell_fills,
+            "realized_pnl": float(summary.realized_pnl),
+            "total_pnl": final_equity - investment,
+            "fees": float(summary.fees),
+            "final_equity": final_equity,
+            "base_position": position,
+            "quote_balance": quote,
+            "max_drawdown": max_drawdown,
+            "max_drawdown_pct": max_drawdown / peak_equity * 100 if peak_equity else 0.0,
+            "elapsed_seconds": elapsed,
+            "candles_per_minute": candles_count / elapsed * 60 if elapsed else 0.0,
+        }
+
+    @staticmethod
+    def _chain(first_candle: Candle, candles: Iterator[Candle]) -> Iterator[Candle]:
+        yield first_candle
+        yield from candles
@@ -0,0 +1,174 @@
+import itertools
+import tempfile
+import time
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from trading_bot import models as trading_bot_models
+from trading_bot import tabdeal_exchange
+from trading_bot.client_pool import client_pool
+from trading_bot.exchange_registry import exchange_providers
+from trading_bot.market_cache import market_cache
+from trading_bot.order_submission import OrderSubmitter
+from trading_bot.rate_limit import rate_limit_gateway
+
+
+class StubSpot:
+    """
+    In-memory stand-in for ``tabdeal.spot.Spot`` answering instantly and deterministically.
+    """
+
+    symbols_count = 1000
+
+    def __init__(self, api_key=None, api_secret=None):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.order_ids = itertools.count(1)
+        self.orders = {}
+
+    def new_order(self, symbol, side, type, quantity, price=None, **kwargs):
+        order_id = next(self.order_ids)
+        self.orders[order_id] = {"orderId": order_id, "symbol": symbol, "status": "NEW"}
+        return {"orderId": order_id}
+
+    def get_order(self, symbol, order_id=None, **kwargs):
+        return self.orders[order_id]
+
+    def get_orders(self, symbol, **kwargs):
+        return list(self.orders.values())
+
+    def get_open_orders(self, symbol=None):
+        return [order for order in self.orders.values() if order["status"] == "NEW"]
+
+    def cancel_order(self, symbol, order_id=None, **kwargs):
+        self.orders[order_id]["status"] = "CANCELED"
+        return self.orders[order_id]
+
+    def exchange_info(self, **kwargs):
+        return [
+            {
+                "symbol": f"COIN{index}USDT",
+                "baseAsset": f"COIN{index}",
+                "quoteAsset": "USDT",
+                "filters": [
+                    {"filterType": "PRICE_FILTER", "tickSize": "0.01"},
+                    {"filterType": "LOT_SIZE", "stepSize": "0.0001"},
+                ],
+            }
+            for index in range(self.symbols_count)
+        ]
+
+    def fill(self, count: int):
+        for order in list(self.orders.values())[:count]:
+            order["status"] = "FILLED"
+
+
+class BenchmarkSuite:
+    """
+    Times the order, grid and market sync hot paths against ``StubSpot`` and counts the
+    queries each one runs. Must run against a throwaway database.
+    """
+
+    def __init__(self, repeat: int = 3):
+        self.repeat = repeat
+        self.spot = None
+
+    def run(self) -> dict:
+        results = {}
+        # the gateway still runs, with its own buckets and limits that never make a scenario wait
+        unlimited = {"account": (1e9, 1e9), "ip": (1e9, 1e9)}
+        with tempfile.TemporaryDirectory() as rate_limit_dir, \
+                mock.patch.object(rate_limit_gateway, "directory", Path(rate_limit_dir)), \
+                mock.patch.object(rate_limit_gateway, "limits", unlimited), \
+                mock.patch.object(market_cache, "check_interval", float("inf")), \
+                mock.patch.object(tabdeal_exchange, "Spot", side_effect=lambda *args, **kwargs: self.spot):
+            for name, scenario in self.scenarios():
+                results[name] = self.measure(scenario)
+        client_pool.clear()
+        market_cache.clear()
+        return results
+
+    def scenarios(self):
+        return [
+            ("grid_create_orders_10", lambda: self.create_orders(10)),
+            ("grid_create_orders_100", lambda: self.create_orders(100)),
+            ("grid_create_orders_1000", lambda: self.create_orders(1000)),
+            ("order_submit_serial_200", lambda: self.submit_orders(200, engine=False)),
+            ("order_submit_engine_200", lambda: self.submit_orders(200, engine=True)),
+            ("market_sync_1000_symbols", self.sync_markets),
+            ("bot_cycle_100_lines", self.bot_cycle),
+        ]
+
+    def measure(self, scenario) -> dict:
+        wall_times = []
+        queries = None
+        for _ in range(self.repeat):
+            self.reset()
+            prepare = scenario()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                prepare()
+                wall_times.append(time.perf_counter() - started)
+            queries = len(captured.captured_queries)
+        return {"wall_time": min(wall_times), "queries": queries}
+
+    def reset(self):
+        self.spot = StubSpot("benchmark", "benchmark")
+        client_pool.clear()
+        for model in [trading_bot_models.Trade, trading_bot_models.Order, trading_bot_models.GridBot,
+                      trading_bot_models.Account, trading_bot_models.Exchange, trading_bot_models.Market,
+                      trading_bot_models.Currency]:
+            model.objects.all().delete()
+        market_cache.clear()
+
+    def make_bot(self, no_grid_lines: int):
+        exchange = trading_bot_models.Exchange.objects.create(
+            exchange_provider=exchange_providers.id("Tabdeal"))
+        account = trading_bot_models.Account.objects.create(exchange=exchange, api_key="benchmark",
+                                                            api_secret="benchmark")
+        base = trading_bot_models.Currency.objects.create(symbol="BTC", precision=6)
+        quote = trading_bot_models.Currency.objects.create(symbol="USDT", precision=2)
+        market = trading_bot_models.Market.objects.create(first_currency=base, second_currency=quote,
+                                                          tick_size=Decimal("0.01"), step_size=Decimal("0.000001"))
+        market_cache.warm()
+        return trading_bot_models.GridBot.objects.create(
+            account=account, market=market, investment=Decimal(10000), no_grid_lines=no_grid_lines,
+            upper_price=Decimal(30000), lower_price=Decimal(20000))
+
+    # each scenario prepares its data and returns the callable that is measured
+
+    def create_orders(self, no_grid_lines: int):
+        bot = self.make_bot(no_grid_lines)
+        return lambda: bot.create_orders(current_price=Decimal(25000))
+
+    def submit_orders(self, count: int, engine: bool):
+        bot = self.make_bot(count * 2)
+        bot.create_orders(current_price=Decimal(30000))
+        orders = trading_bot_models.Order.objects.filter(grid_bot=bot)[:count]
+        order_ids = list(orders.values_list("id", flat=True))
+        if engine:
+            submitter = OrderSubmitter(rate=1_000_000, burst=1_000_000)
+            return lambda: submitter.submit(trading_bot_models.Order.objects.filter(id__in=order_ids))
+
+        def submit():
+            for order in trading_bot_models.Order.objects.filter(id__in=order_ids).select_related(
+                    "exchange", "account"):
+                order.submit_order()
+        return submit
+
+    def sync_markets(self):
+        exchange = trading_bot_models.Exchange.objects.create(
+            exchange_provider=exchange_providers.id("Tabdeal"))
+        return exchange.get_and_update_markets
+
+    def bot_cycle(self):
+        bot = self.make_bot(100)
+        bot.create_orders(current_price=Decimal(25000))
+        for order in trading_bot_models.Order.objects.filter(grid_bot=bot).select_related("exchange", "account"):
+            order.submit_order()
+        self.spot.fill(10)
+        return bot.check_and_update_order_state_and_create_new_order_if_needed
@@ -0,0 +1,154 @@
+import heapq
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+
+from trading_bot import models as trading_bot_models
+from trading_bot.market_cache import market_cache
+from trading_bot.order_retry import RetryScheduler
+from trading_bot.order_submission import OrderSubmitter
+from trading_bot.streaming import order_streams
+
+logger = logging.getLogger(__name__)
+
+
+class BotRunner:
+    """
+    Drives every active ``GridBot``.
+
+    Bots are sharded by (account, market) and a shard runs all of its bots in one cycle,
+    on the shortest cycle interval among them: their orders are reconciled with one set of
+    exchange requests, so the requests grow with the shards and not with the bots. A shard
+    runs at most one cycle at a time, while different shards run in parallel on a thread
+    pool. A shard that finds every worker busy is pushed back instead of queued behind the
+    slow work, so a slow exchange only delays the bots that depend on it.
+    """
+
+    def __init__(self, max_workers: int = 8, refresh_interval: float = 30, jitter: float = 0.1,
+                 retry_delay: float = 1, stream: bool = False, submit: bool = True):
+        self.max_workers = max_workers
+        self.stream = stream
+        self.submit = submit
+        self.refresh_interval = refresh_interval
+        self.jitter = jitter
+        self.retry_delay = retry_delay
+        self.stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._schedule = []
+        self._shards = {}
+        self._scheduled_shards = set()
+        self._busy_shards = set()
+        self._next_refresh = 0
+        # one submitter for every cycle, so the per account rate limits hold across cycles
+        self.submitter = OrderSubmitter()
+        self.retry_scheduler = RetryScheduler(submitter=self.submitter)
+
+    def stop(self, *args):
+        self.stop_event.set()
+
+    def run(self):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while not self.stop_event.is_set():
+                now = time.monotonic()
+                if now >= self._next_refresh:
+                    # a failed refresh keeps the current schedule and is tried again next interval
+                    try:
+                        self._refresh_bots(now)
+                    except Exception:
+                        logger.exception("refreshing the bots failed")
+                    finally:
+                        connections.close_all()
+                    self._next_refresh = now + self.refresh_interval
+                self._dispatch(executor, now)
+                with self._lock:
+                    next_run = self._schedule[0][0] if self._schedule else now + self.retry_delay
+                self.stop_event.wait(timeout=max(0.01, min(next_run, self._next_refresh) - time.monotonic()))
+            logger.info("stopping, waiting for %s running cycles", len(self._busy_shards))
+        order_streams.stop_all(timeout=5)
+
+    def _refresh_bots(self, now: float):
+        bots = {
+            bot_id: (account_id, market_id, cycle_interval)
+            for bot_id, account_id, market_id, cycle_interval in trading_bot_models.GridBot.objects.filter(
+                active=True).values_list("id", "account_id", "market_id", "cycle_interval")
+        }
+        shards = {}
+        for bot_id, (account_id, market_id, cycle_interval) in sorted(bots.items()):
+            bot_ids, shard_interval = shards.get((account_id, market_id), ([], cycle_interval))
+            shards[(account_id, market_id)] = (bot_ids + [bot_id], min(shard_interval, cycle_interval))
+        with self._lock:
+            for shard, (_, cycle_interval) in shards.items():
+                if shard not in self._scheduled_shards:
+                    self._scheduled_shards.add(shard)
+                    heapq.heappush(self._schedule, (now + random.uniform(0, cycle_interval * self.jitter), shard))
+            # shards left without active bots drop out of the schedule the next time they come up
+            self._shards = shards
+        if self.stream:
+            self._start_streams(bots)
+
+    @staticmethod
+    def _start_streams(bots: dict):
+        markets_by_account = defaultdict(set)
+        for account_id, market_id, _ in bots.values():
+            markets_by_account[account_id].add(market_id)
+        for account in trading_bot_models.Account.objects.select_related("exchange").filter(
+                id__in=markets_by_account.keys()):
+            if order_streams.running(account.id):
+                continue
+            try:
+                stream = account.exchange.exchange_interface(
+                    api_key=account.api_key, api_secret=account.api_secret
+                ).open_stream(symbols=[market_cache.get(market_id).symbol
+                                       for market_id in markets_by_account[account.id]])
+                order_streams.start(account.id, stream)
+            except Exception:
+                logger.exception("could not open the stream of account %s, polling instead", account.id)
+
+    def _dispatch(self, executor, now: float):
+        with self._lock:
+            deferred = []
+            while self._schedule and self._schedule[0][0] <= now:
+                _, shard = heapq.heappop(self._schedule)
+                if shard not in self._shards:
+                    self._scheduled_shards.discard(shard)
+                    continue
+                if len(self._busy_shards) >= self.max_workers:
+                    deferred.append((now + self.retry_delay, shard))
+                    continue
+                self._busy_shards.add(shard)
+                executor.submit(self._run_cycle, shard, self._shards[shard][0])
+            for entry in deferred:
+                heapq.heappush(self._schedule, entry)
+
+    def _run_cycle(self, shard: tuple, bot_ids: list):
+        started = time.monotonic()
+        try:
+            # bots deactivated since the last refresh are left out
+            bot_ids = list(trading_bot_models.GridBot.objects.filter(id__in=bot_ids, active=True)
+                           .values_list("id", flat=True))
+            if bot_ids:
+                trading_bot_models.GridBot.check_and_update_bots(bot_ids)
+                if self.submit:
+                    shard_orders = trading_bot_models.Order.objects.filter(grid_bot_id__in=bot_ids)
+                    self.submitter.submit(
+                        shard_orders.filter(state=trading_bot_models.Order.State.WaitingToSubmit.value))
+                    self.retry_scheduler.run_due(orders=shard_orders)
+        except Exception:
+            logger.exception("cycle of the bots %s failed", bot_ids)
+        finally:
+            connections.close_all()
+            finished = time.monotonic()
+            logger.debug("cycle of the bots %s took %.3fs", bot_ids, finished - started)
+            with self._lock:
+                self._busy_shards.discard(shard)
+                if shard in self._shards:
+                    cycle_interval = self._shards[shard][1]
+                    heapq.heappush(self._schedule, (
+                        finished + cycle_interval * (1 + random.uniform(-self.jitter, self.jitter)), shard))
+                else:
+                    self._scheduled_shards.discard(shard)
@@ -0,0 +1,107 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class ClientPool:
+    """
+    Process-wide pool of exchange API clients keyed by provider and credentials.
+
+    Reusing a client reuses its HTTP session, so keep-alive connections survive between
+    calls. Entries are evicted least-recently-used first and once they have been idle for
+    longer than ``idle_timeout`` seconds. Since the key is derived from the credentials, an
+    account whose api key/secret changed gets a freshly built client.
+    """
+
+    def __init__(self, max_size: int = 32, idle_timeout: float = 300):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(provider: str, api_key, api_secret) -> tuple:
+        secret_digest = hashlib.sha256((api_secret or "").encode()).hexdigest()
+        return provider, api_key, secret_digest
+
+    def get_client(self, key: tuple, factory):
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._clients.get(key)
+            if entry is not None:
+                self._clients.move_to_end(key)
+                entry[1] = now
+                self.hits += 1
+                return entry[0]
+
+            self.misses += 1
+            client = factory()
+            self._clients[key] = [client, now]
+            while len(self._clients) > self.max_size:
+                _, (evicted_client, _) = self._clients.popitem(last=False)
+                self._close(evicted_client)
+                self.evictions += 1
+            return client
+
+    def clear(self):
+        with self._lock:
+            for client, _ in self._clients.values():
+                self._close(client)
+            self._clients.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._clients),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "open_connections": sum(self._open_connections(client) for client, _ in self._clients.values()),
+            }
+
+    def _evict_idle(self, now: float):
+        for key, (client, last_used) in list(self._clients.items()):
+            if now - last_used <= self.idle_timeout:
+                # entries are ordered by last use, so the rest are fresher
+                break
+            del self._clients[key]
+            self._close(client)
+            self.evictions += 1
+
+    @staticmethod
+    def _close(client):
+        session = getattr(client, "session", None)
+        if session is not None:
+            session.close()
+
+    @staticmethod
+    def _open_connections(client) -> int:
+        session = getattr(client, "session", None)
+        if session is None:
+            return 0
+        open_connections = 0
+        for adapter in session.adapters.values():
+            pool_manager = getattr(adapter, "poolmanager", None)
+            if pool_manager is None:
+                continue
+            for key in pool_manager.pools.keys():
+                connection_pool = pool_manager.pools[key]
+                open_connections += sum(1 for connection in list(connection_pool.pool.queue) if connection is not None)
+        return open_connections
+
+
+client_pool = ClientPool(
+    max_size=getattr(settings, "EXCHANGE_CLIENT_POOL_MAX_SIZE", 32),
+    idle_timeout=getattr(settings, "EXCHANGE_CLIENT_POOL_IDLE_TIMEOUT", 300),
+)
+
+
+def client_pool_gauges() -> dict:
+    return {("exchange_client_pool_" + name, ()): value for name, value in client_pool.stats().items()}
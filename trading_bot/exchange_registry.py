@@ -0,0 +1,56 @@
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+BUILTIN_EXCHANGE_PROVIDERS = {
+    1: ("Tabdeal", "trading_bot.tabdeal_exchange.Tabdeal"),
+    2: ("Simulator", "trading_bot.tabdeal_exchange.Simulator"),
+}
+
+
+class ExchangeProviderRegistry:
+    """
+    Exchange providers by id, each a name and the dotted path of its
+    ``BaseExchangeInterFace`` implementation. A provider's module, and its exchange SDK
+    with it, is imported the first time an interface of that provider is built, so
+    processes that never talk to an exchange do not pay for the import.
+    """
+
+    def __init__(self, providers: dict):
+        self._providers = dict(providers)
+        self._classes = {}
+        self._lock = threading.Lock()
+
+    def register(self, provider_id: int, name: str, dotted_path: str):
+        with self._lock:
+            self._providers[provider_id] = (name, dotted_path)
+            self._classes.pop(provider_id, None)
+
+    def __contains__(self, provider_id) -> bool:
+        return provider_id in self._providers
+
+    def choices(self) -> list:
+        return [(provider_id, name) for provider_id, (name, _) in sorted(self._providers.items())]
+
+    def name(self, provider_id: int) -> str:
+        return self._providers[provider_id][0]
+
+    def id(self, name: str) -> int:
+        for provider_id, (provider_name, _) in self._providers.items():
+            if provider_name == name:
+                return provider_id
+        raise KeyError(name)
+
+    def exchange_class(self, provider_id: int):
+        exchange_class = self._classes.get(provider_id)
+        if exchange_class is None:
+            with self._lock:
+                exchange_class = self._classes[provider_id] = import_string(self._providers[provider_id][1])
+        return exchange_class
+
+
+exchange_providers = ExchangeProviderRegistry({
+    **BUILTIN_EXCHANGE_PROVIDERS,
+    **getattr(settings, "EXCHANGE_PROVIDERS", {}),
+})
@@ -0,0 +1,129 @@
+import bisect
+from decimal import Decimal, ROUND_CEILING, ROUND_FLOOR
+from typing import List, NamedTuple, Optional
+
+
+class GridLevel(NamedTuple):
+    side: int
+    price: Decimal
+    amount: Decimal
+
+
+class GridPlanner:
+    """
+    Computes the levels of a grid with scaled integer arithmetic: prices are counted in
+    ticks and amounts in steps, so every level lands exactly on the exchange's price and
+    quantity grid without any per-level Decimal division. Levels worth less than the
+    market's minimum notional are left out rather than sent to be rejected.
+
+    A new grid holds only quote currency: it places buys on the levels below the price,
+    sharing the investment between them, and leaves the level nearest the price empty.
+    Sells are only ever placed as counter orders for base a buy bought, so every level
+    holds at most one order.
+    """
+
+    def __init__(self, lower_price: Decimal, upper_price: Decimal, no_grid_lines: int, investment: Decimal,
+                 tick_size: Decimal, step_size: Decimal, geometric: bool = False, min_notional: Decimal = None):
+        if no_grid_lines <= 0 or lower_price <= 0 or upper_price <= lower_price:
+            raise ValueError("grid needs a positive price range and at least one line")
+        if lower_price < tick_size:
+            raise ValueError(f"lower price {lower_price} is below the tick size {tick_size}")
+        self.lower_price = lower_price
+        self.upper_price = upper_price
+        self.no_grid_lines = no_grid_lines
+        self.investment = investment
+        self.tick_size = tick_size
+        self.step_size = step_size
+        self.geometric = geometric
+        self.min_notional = min_notional or Decimal(0)
+        self._level_ticks = None
+
+    def price_ticks(self, include_upper: bool = False) -> List[int]:
+        lower_ticks = int((self.lower_price / self.tick_size).to_integral_value())
+        upper_ticks = int((self.upper_price / self.tick_size).to_integral_value())
+        lines = self.no_grid_lines
+        count = lines + 1 if include_upper else lines
+        if not self.geometric:
+            span = upper_ticks - lower_ticks
+            return [lower_ticks + (i * span) // lines for i in range(count)]
+        ratio = (upper_ticks / lower_ticks) ** (1 / lines)
+        return [round(lower_ticks * ratio ** i) for i in range(count)]
+
+    def adjacent_price(self, price: Decimal, above: bool) -> Optional[Decimal]:
+        """
+        The grid level right above or below ``price``, the upper price counting as the last
+        level. ``None`` when the grid ends there.
+        """
+        if self._level_ticks is None:
+            self._level_ticks = self.price_ticks(include_upper=True)
+        price_ticks = self._level_ticks
+        current_ticks = price / self.tick_size
+        if above:
+            index = bisect.bisect_right(price_ticks, current_ticks)
+        else:
+            index = bisect.bisect_left(price_ticks, current_ticks) - 1
+        if index < 0 or index >= len(price_ticks):
+            return None
+        return price_ticks[index] * self.tick_size.normalize()
+
+    def counter_level(self, side: int, price: Decimal, amount: Decimal, buy_side: int = 1,
+                      sell_side: int = 2) -> Optional[GridLevel]:
+        """
+        The opposite order for ``amount`` executed at ``price``: a sell one level above a
+        buy, a buy one level below a sell. ``None`` when the grid ends there or the amount
+        is worth less than the minimum notional.
+        """
+        counter_side = sell_side if side == buy_side else buy_side
+        counter_price = self.adjacent_price(price, above=counter_side == sell_side)
+        if counter_price is None:
+            return None
+        step = self.step_size.normalize()
+        counter_amount = (amount / step).to_integral_value(ROUND_FLOOR) * step
+        if counter_amount <= 0 or counter_price * counter_amount < self.min_notional:
+            return None
+        return GridLevel(side=counter_side, price=counter_price, amount=counter_amount)
+
+    def counter_levels(self, fills, occupied_prices: set, buy_side: int = 1, sell_side: int = 2) -> List[GridLevel]:
+        """
+        The counter orders for ``fills``, ``(side, price, executed amount)`` of finished
+        orders. A level in ``occupied_prices`` already holds an order and gets no other one,
+        the levels returned are added to it. Used by the live bot and the backtest alike.
+        """
+        levels = []
+        for side, price, amount in fills:
+            level = self.counter_level(side, price, amount, buy_side=buy_side, sell_side=sell_side)
+            if level is None or level.price in occupied_prices:
+                continue
+            occupied_prices.add(level.price)
+            levels.append(level)
+        return levels
+
+    def plan(self, current_price: Optional[Decimal] = None, buy_side: int = 1) -> List[GridLevel]:
+        if current_price is None:
+            current_price = (self.lower_price + self.upper_price) / 2
+        current_ticks = current_price / self.tick_size
+        level_ticks = sorted(set(self.price_ticks()))
+        if not level_ticks:
+            return []
+        # the level nearest the price stays empty, the first buy that fills puts its sell there
+        empty_ticks = min(level_ticks, key=lambda price_ticks: abs(price_ticks - current_ticks))
+        buy_ticks = [price_ticks for price_ticks in level_ticks
+                     if price_ticks < current_ticks and price_ticks != empty_ticks]
+        if not buy_ticks:
+            return []
+
+        # level_value / (price_ticks * tick * step) is the amount in steps for a level, a level's
+        # notional is price_ticks * amount_steps units of tick * step
+        unit_value = self.tick_size * self.step_size
+        value_units = int((self.investment / len(buy_ticks) / unit_value).to_integral_value(ROUND_FLOOR))
+        min_notional_units = int((self.min_notional / unit_value).to_integral_value(ROUND_CEILING))
+        tick = self.tick_size.normalize()
+        step = self.step_size.normalize()
+
+        levels = []
+        for price_ticks in buy_ticks:
+            amount_steps = value_units // price_ticks
+            if amount_steps <= 0 or price_ticks * amount_steps < min_notional_units:
+                continue
+            levels.append(GridLevel(side=buy_side, price=price_ticks * tick, amount=amount_steps * step))
+        return levels
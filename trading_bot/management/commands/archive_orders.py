@@ -0,0 +1,30 @@
+import logging
+import signal
+import threading
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from trading_bot.order_archive import OrderArchive
+
+
+class Command(BaseCommand):
+    help = "Move terminal orders and their trades older than the archive age to the monthly archive files"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--age-days", type=float, help="defaults to ORDER_ARCHIVE_AFTER_DAYS")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--interval", type=float,
+                            help="keep running and archive every this many seconds until SIGINT/SIGTERM")
+
+    def handle(self, *args, **options):
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+        archive = OrderArchive(age=timedelta(days=options["age_days"]) if options["age_days"] is not None else None,
+                               batch_size=options["batch_size"])
+        stop_event = threading.Event()
+        signal.signal(signal.SIGINT, lambda *args: stop_event.set())
+        signal.signal(signal.SIGTERM, lambda *args: stop_event.set())
+        while True:
+            self.stdout.write(f"archived {archive.archive()} orders to {archive.directory}")
+            if options["interval"] is None or stop_event.wait(options["interval"]):
+                break
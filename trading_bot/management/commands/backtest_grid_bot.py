@@ -0,0 +1,55 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from trading_bot import models as trading_bot_models
+from trading_bot.backtest import GridBacktest, read_candles
+from trading_bot.grid_planner import GridPlanner
+
+
+class Command(BaseCommand):
+    help = "Replay historical candles (CSV or binary) against a grid bot's parameters"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="candles file, .csv or the packed binary format")
+        parser.add_argument("--bot", type=int, help="take the grid parameters from this GridBot")
+        parser.add_argument("--lower-price", type=Decimal)
+        parser.add_argument("--upper-price", type=Decimal)
+        parser.add_argument("--grid-lines", type=int)
+        parser.add_argument("--investment", type=Decimal)
+        parser.add_argument("--geometric", action="store_true")
+        parser.add_argument("--tick-size", type=Decimal, default=Decimal("0.01"))
+        parser.add_argument("--step-size", type=Decimal, default=Decimal("0.000001"))
+        parser.add_argument("--min-notional", type=Decimal, default=Decimal(0))
+        parser.add_argument("--fee-rate", type=float, default=0.0)
+
+    def handle(self, *args, **options):
+        if options["bot"]:
+            try:
+                bot = trading_bot_models.GridBot.objects.get(id=options["bot"])
+            except trading_bot_models.GridBot.DoesNotExist:
+                raise CommandError(f"GridBot {options['bot']} does not exist")
+            planner = bot.grid_planner()
+            investment = bot.investment
+        else:
+            required = ["lower_price", "upper_price", "grid_lines", "investment"]
+            missing = [name for name in required if options[name] is None]
+            if missing:
+                raise CommandError(f"either --bot or {', '.join('--' + name.replace('_', '-') for name in missing)} "
+                                   f"is required")
+            investment = options["investment"]
+            planner = GridPlanner(
+                lower_price=options["lower_price"],
+                upper_price=options["upper_price"],
+                no_grid_lines=options["grid_lines"],
+                investment=investment,
+                tick_size=options["tick_size"],
+                step_size=options["step_size"],
+                min_notional=options["min_notional"],
+                geometric=options["geometric"]
+            )
+
+        result = GridBacktest(planner=planner, investment=investment,
+                              fee_rate=options["fee_rate"]).run(read_candles(options["path"]))
+        for key, value in result.items():
+            self.stdout.write(f"{key}: {value:.8f}" if isinstance(value, float) else f"{key}: {value}")
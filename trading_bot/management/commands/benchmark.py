@@ -0,0 +1,56 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from trading_bot.benchmarks import BenchmarkSuite
+
+DEFAULT_BASELINE = Path(__file__).resolve().parents[2] / "benchmark_baseline.json"
+
+
+class Command(BaseCommand):
+    help = ("Benchmark the order, grid and market sync hot paths against a stubbed exchange on a test "
+            "database and compare with the stored baseline")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+        parser.add_argument("--update-baseline", action="store_true")
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--time-tolerance", type=float, default=0.5,
+                            help="allowed wall time increase over the baseline, 0.5 is +50%%")
+        parser.add_argument("--time-slack", type=float, default=5,
+                            help="milliseconds always allowed on top, keeps millisecond scenarios from flapping")
+
+    def handle(self, *args, **options):
+        old_database_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = BenchmarkSuite(repeat=options["repeat"]).run()
+        finally:
+            connection.creation.destroy_test_db(old_database_name, verbosity=0)
+
+        baseline_path = Path(options["baseline"])
+        if options["update_baseline"]:
+            baseline_path.write_text(json.dumps(results, indent=4, sort_keys=True) + "\n")
+            self.stdout.write(f"baseline written to {baseline_path}")
+        baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+
+        regressions = []
+        for name, result in results.items():
+            expected = baseline.get(name)
+            line = f"{name}: {result['wall_time'] * 1000:.2f}ms, {result['queries']} queries"
+            if expected is None:
+                self.stdout.write(f"{line} (no baseline)")
+                continue
+            line += f" (baseline {expected['wall_time'] * 1000:.2f}ms, {expected['queries']} queries)"
+            if result["queries"] > expected["queries"] or \
+                    result["wall_time"] > expected["wall_time"] * (1 + options["time_tolerance"]) + \
+                    options["time_slack"] / 1000:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(self.style.SUCCESS(line))
+
+        if regressions:
+            raise CommandError(f"regressions in {', '.join(regressions)}")
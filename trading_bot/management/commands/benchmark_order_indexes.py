@@ -0,0 +1,132 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from trading_bot import models as trading_bot_models
+from trading_bot.exchange_registry import exchange_providers
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Grow the order table with synthetic history inside a transaction, print the query plans and "
+            "timings of the bot cycle queries at every size, check each is served by its index, then roll "
+            "everything back")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000],
+                            help="order table sizes to measure at")
+        parser.add_argument("--bots", type=int, default=100)
+        parser.add_argument("--active-ratio", type=float, default=0.01,
+                            help="share of the orders still Waiting/PartiallyFilled")
+        parser.add_argument("--batch-size", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                failures = self.run(options)
+                raise Rollback()
+        except Rollback:
+            self.stdout.write("synthetic data rolled back")
+        if failures:
+            raise CommandError(f"not served by the expected index: {', '.join(failures)}")
+
+    def run(self, options) -> list:
+        exchange, _ = trading_bot_models.Exchange.objects.get_or_create(
+            exchange_provider=exchange_providers.id("Tabdeal"))
+        account = trading_bot_models.Account.objects.create(exchange=exchange, api_key="benchmark",
+                                                            api_secret="benchmark")
+        base = trading_bot_models.Currency.objects.create(symbol="BENCH")
+        quote = trading_bot_models.Currency.objects.create(symbol="BENCHQ")
+        market = trading_bot_models.Market.objects.create(first_currency=base, second_currency=quote)
+        bots = [
+            trading_bot_models.GridBot.objects.create(account=account, market=market, investment=Decimal(1000),
+                                                      no_grid_lines=10, upper_price=Decimal(200),
+                                                      lower_price=Decimal(100), active=False)
+            for _ in range(options["bots"])
+        ]
+
+        failures = []
+        inserted = 0
+        for size in sorted(options["sizes"]):
+            started = time.perf_counter()
+            self.insert_orders(inserted, size, options, exchange, account, market, bots)
+            self.stdout.write(f"inserted {size - inserted} orders in {time.perf_counter() - started:.1f}s, "
+                              f"{size} in the table")
+            inserted = size
+            if connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute(f"ANALYZE {trading_bot_models.Order._meta.db_table}")
+            failures.extend(f"{name} at {size}" for name in self.measure(bots[0], account, market, size))
+        return failures
+
+    @staticmethod
+    def insert_orders(start: int, end: int, options, exchange, account, market, bots):
+        active_every = max(1, round(1 / options["active_ratio"])) if options["active_ratio"] else 0
+        terminal_states = [trading_bot_models.Order.State.Filled.value, trading_bot_models.Order.State.Canceled.value]
+        # plain executemany, the ORM would spend most of the time building model instances
+        now = timezone.now()
+        insert = (f"INSERT INTO {trading_bot_models.Order._meta.db_table} "
+                  "(created, updated, exchange_id, grid_bot_id, account_id, market_id, price, amount, side, "
+                  "remote_id, state, filled_amount) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)")
+        price, amount = Decimal(150), Decimal(1)
+        with connection.cursor() as cursor:
+            for batch_start in range(start, end, options["batch_size"]):
+                rows = []
+                for index in range(batch_start, min(batch_start + options["batch_size"], end)):
+                    if active_every and index % active_every == 0:
+                        state, filled_amount = trading_bot_models.Order.State.Waiting.value, 0
+                    else:
+                        state = terminal_states[index % 2]
+                        filled_amount = amount if state == trading_bot_models.Order.State.Filled.value else 0
+                    rows.append((now, now, exchange.id, bots[index % len(bots)].id, account.id, market.id, price,
+                                 amount, 1, index + 1, state, filled_amount))
+                cursor.executemany(insert, rows)
+
+    def measure(self, bot, account, market, size: int) -> list:
+        """
+        Prints the plan and timing of every query, returns the names of those whose plan does
+        not name one of the indexes expected to serve them.
+        """
+        active_states = trading_bot_models.Order.State.active_states()
+        # the partial indexes are skipped on databases without partial index support, the
+        # composite ones serve those queries there
+        queries = {
+            "active orders of a bot": (
+                bot.bot_orders.filter(state__in=active_states, remote_id__isnull=False),
+                ["order_grid_bot_active_idx", "order_grid_bot_state_idx"]),
+            "orders of a bot waiting to submit": (
+                bot.bot_orders.filter(state=trading_bot_models.Order.State.WaitingToSubmit.value),
+                ["order_grid_bot_to_submit_idx", "order_grid_bot_state_idx"]),
+            "active orders of an account/market": (
+                trading_bot_models.Order.objects.filter(account=account, market=market, state__in=active_states),
+                ["order_account_market_state_idx"]),
+            "order by remote id of an account": (
+                trading_bot_models.Order.objects.filter(account=account, remote_id=size // 2),
+                ["order_account_remote_id_idx"]),
+            # only indexed columns are selected, so the index alone can answer it
+            "active order states of a bot (index only)": (
+                bot.bot_orders.filter(state__in=active_states).values_list("grid_bot_id", "state"),
+                ["order_grid_bot_state_idx"]),
+        }
+        failures = []
+        for name, (queryset, index_names) in queries.items():
+            plan = queryset.explain()
+            started = time.perf_counter()
+            rows = len(list(queryset))
+            elapsed = (time.perf_counter() - started) * 1000
+            used_index = next((index_name for index_name in index_names if index_name in plan), None)
+            if used_index is None:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(
+                    f"{size} orders, {name}: {rows} rows in {elapsed:.2f}ms, none of {', '.join(index_names)} used"))
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f"{size} orders, {name}: {rows} rows in {elapsed:.2f}ms using {used_index}"))
+            self.stdout.write(plan)
+        return failures
@@ -0,0 +1,30 @@
+import argparse
+
+from django.core.management.base import BaseCommand, CommandError
+
+from trading_bot import models as trading_bot_models
+from trading_bot.order_cancellation import OrderCanceller
+
+
+class Command(BaseCommand):
+    help = "Deactivate grid bots and cancel their orders, safe to run again for orders left open"
+
+    def add_arguments(self, parser):
+        parser.add_argument("bots", nargs="*", type=int, help="ids of the bots to stop")
+        parser.add_argument("--account", type=int, action="append", default=[],
+                            help="stop every bot of this account, can be repeated")
+        parser.add_argument("--workers", type=int, help="cancels running in parallel")
+        parser.add_argument("--cancel-all", action=argparse.BooleanOptionalAction,
+                            help="cancel all open orders of an account and market in one request when every one "
+                                 "of its bot orders is being cancelled, including orders placed outside the bots; "
+                                 "ORDER_CANCELLATION_CANCEL_ALL by default")
+
+    def handle(self, *args, **options):
+        if not options["bots"] and not options["account"]:
+            raise CommandError("pass bot ids or --account")
+        bots = trading_bot_models.GridBot.objects.filter(id__in=options["bots"]) | \
+            trading_bot_models.GridBot.objects.filter(account_id__in=options["account"])
+        canceller = OrderCanceller(max_workers=options["workers"], cancel_all=options["cancel_all"])
+        for report in canceller.deactivate(bots):
+            self.stdout.write(f"bot {report.grid_bot_id}: {report.canceled} canceled, {report.filled} filled, "
+                              f"{report.partially_filled} partially filled, {report.still_open} still open in {report.seconds:.3f}s")
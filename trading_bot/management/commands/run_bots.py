@@ -0,0 +1,35 @@
+import logging
+import signal
+
+from django.core.management.base import BaseCommand
+
+from trading_bot.bot_runner import BotRunner
+from trading_bot.metrics import serve_metrics
+
+
+class Command(BaseCommand):
+    help = "Run every active GridBot until SIGINT/SIGTERM"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8, help="cycles running in parallel")
+        parser.add_argument("--refresh-interval", type=float, default=30,
+                            help="seconds between two reloads of the active bots")
+        parser.add_argument("--jitter", type=float, default=0.1, help="fraction of the cycle interval")
+        parser.add_argument("--stream", action="store_true",
+                            help="follow order updates over the exchange stream, polling only as a fallback")
+        parser.add_argument("--queue", action="store_true",
+                            help="leave order submission to run_order_queue workers")
+        parser.add_argument("--metrics-port", type=int, help="serve this process's metrics on /metrics")
+        parser.add_argument("--metrics-address", default="127.0.0.1")
+
+    def handle(self, *args, **options):
+        logging.basicConfig(level=logging.INFO if options["verbosity"] < 2 else logging.DEBUG,
+                            format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+        if options["metrics_port"]:
+            serve_metrics(options["metrics_port"], options["metrics_address"])
+        runner = BotRunner(max_workers=options["workers"], refresh_interval=options["refresh_interval"],
+                           jitter=options["jitter"], stream=options["stream"],
+                           submit=not options["queue"])
+        signal.signal(signal.SIGINT, runner.stop)
+        signal.signal(signal.SIGTERM, runner.stop)
+        runner.run()
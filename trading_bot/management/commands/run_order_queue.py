@@ -0,0 +1,53 @@
+import logging
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from trading_bot.metrics import serve_metrics
+from trading_bot.order_queue import OrderQueueWorker
+
+
+def run_worker(batch_size: int, poll_interval: float, metrics_port: int = None, metrics_address: str = None):
+    if metrics_port:
+        serve_metrics(metrics_port, metrics_address)
+    worker = OrderQueueWorker(batch_size=batch_size, poll_interval=poll_interval)
+    signal.signal(signal.SIGINT, worker.stop)
+    signal.signal(signal.SIGTERM, worker.stop)
+    worker.run()
+
+
+class Command(BaseCommand):
+    help = "Submit WaitingToSubmit orders from the shared queue, run several of these to scale out"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=1)
+        parser.add_argument("--batch-size", type=int, default=20)
+        parser.add_argument("--poll-interval", type=float, default=1)
+        parser.add_argument("--metrics-port", type=int,
+                            help="serve each process's metrics on /metrics, process n on this port + n")
+        parser.add_argument("--metrics-address", default="127.0.0.1")
+
+    def handle(self, *args, **options):
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(process)d %(name)s: %(message)s")
+        if options["processes"] == 1:
+            run_worker(options["batch_size"], options["poll_interval"], options["metrics_port"],
+                       options["metrics_address"])
+            return
+
+        # forked children must not share the parent's database connections
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        processes = [
+            context.Process(target=run_worker, args=(
+                options["batch_size"], options["poll_interval"],
+                options["metrics_port"] + index if options["metrics_port"] else None, options["metrics_address"]))
+            for index in range(options["processes"])
+        ]
+        for process in processes:
+            process.start()
+        signal.signal(signal.SIGINT, lambda *args: [process.terminate() for process in processes])
+        signal.signal(signal.SIGTERM, lambda *args: [process.terminate() for process in processes])
+        for process in processes:
+            process.join()
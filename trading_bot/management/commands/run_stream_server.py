@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from trading_bot.backtest import read_candles
+from trading_bot.stream_server import LocalStreamServer
+
+
+class Command(BaseCommand):
+    help = "Serve a local stand-in for the exchange stream, replaying candle closes as trade events"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="candles file, .csv or the packed binary format")
+        parser.add_argument("--symbol", default="BTCUSDT")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--interval", type=float, default=1, help="seconds between two trade events")
+
+    def handle(self, *args, **options):
+        server = LocalStreamServer(port=options["port"]).start()
+        self.stdout.write(f"serving on {server.url}, set TABDEAL_STREAM_URL to it")
+        try:
+            for candle in read_candles(options["path"]):
+                server.publish({"e": "trade", "E": candle.timestamp, "s": options["symbol"], "p": str(candle.close)})
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.stop()
@@ -0,0 +1,121 @@
+import threading
+import time
+from decimal import Decimal
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from trading_bot.market_filters import MarketFilter
+
+
+class MarketInfo(NamedTuple):
+    id: int
+    symbol: str
+    tabdeal_symbol: str
+    base_precision: int
+    quote_precision: int
+    tick_size: Optional[Decimal]
+    step_size: Optional[Decimal]
+    min_notional: Optional[Decimal]
+    market_filter: MarketFilter
+
+
+class MarketCache:
+    """
+    In-process market metadata and filters keyed by market id, so the order hot path does
+    not have to query markets and follow their currency foreign keys. The whole table is
+    loaded with one query on first use and dropped whenever a market or currency changes
+    in this process. Changes made by other processes, a market sync from the admin for
+    instance, are picked up by comparing the newest ``updated`` of the markets and their
+    currencies at most every ``check_interval`` seconds.
+    """
+
+    def __init__(self, check_interval: float = None):
+        self.check_interval = check_interval if check_interval is not None else \
+            getattr(settings, "MARKET_CACHE_CHECK_INTERVAL", 5)
+        self._markets = None
+        self._version = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    def get(self, market_id: int) -> MarketInfo:
+        markets = self._markets
+        if markets is None:
+            markets = self.warm()
+        elif time.monotonic() - self._checked_at >= self.check_interval:
+            markets = self.refresh()
+        market_info = markets.get(market_id)
+        if market_info is None:
+            # created after the cache was warmed
+            markets = self.warm()
+            market_info = markets[market_id]
+        return market_info
+
+    def warm(self, version: tuple = None) -> dict:
+        from trading_bot.models import Market
+
+        checked_at = time.monotonic()
+        version = version or self.version()
+        markets = {market.id: self.market_info(market)
+                   for market in Market.objects.select_related("first_currency", "second_currency")}
+        with self._lock:
+            self._markets = markets
+            self._version = version
+            self._checked_at = checked_at
+        return markets
+
+    def refresh(self) -> dict:
+        checked_at = time.monotonic()
+        version = self.version()
+        with self._lock:
+            markets = self._markets
+            if markets is not None and version == self._version:
+                self._checked_at = checked_at
+                return markets
+        return self.warm(version)
+
+    @staticmethod
+    def version() -> tuple:
+        from trading_bot.models import Market
+
+        aggregates = Market.objects.aggregate(
+            count=Count("id"), updated=Max("updated"), first_currency_updated=Max("first_currency__updated"),
+            second_currency_updated=Max("second_currency__updated"))
+        return tuple(aggregates.values())
+
+    def clear(self):
+        with self._lock:
+            self._markets = None
+            self._version = None
+
+    @staticmethod
+    def market_info(market) -> MarketInfo:
+        return MarketInfo(
+            id=market.id,
+            symbol=f"{market.first_currency.symbol}{market.second_currency.symbol}",
+            tabdeal_symbol=f"{market.first_currency.symbol}_{market.second_currency.symbol}",
+            base_precision=market.first_currency.precision,
+            quote_precision=market.second_currency.precision,
+            tick_size=market.tick_size,
+            step_size=market.step_size,
+            min_notional=market.min_notional,
+            market_filter=MarketFilter.for_market(
+                tick_size=market.tick_size,
+                step_size=market.step_size,
+                min_notional=market.min_notional,
+                base_precision=market.first_currency.precision,
+                quote_precision=market.second_currency.precision,
+            ),
+        )
+
+
+market_cache = MarketCache()
+
+
+@receiver([post_save, post_delete], sender="trading_bot.Market")
+@receiver([post_save, post_delete], sender="trading_bot.Currency")
+def invalidate_market_cache(sender, **kwargs):
+    market_cache.clear()
@@ -0,0 +1,88 @@
+from decimal import ROUND_CEILING, ROUND_FLOOR, Decimal
+from typing import Optional
+
+
+class OrderFilterError(ValueError):
+    """
+    An order the exchange would reject for its market's filters, ``code`` names the filter.
+    """
+
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+class MarketFilter:
+    """
+    A market's price tick, quantity step and minimum notional as integers. Prices are
+    counted in units of 10 ** -price_scale and quantities in units of 10 ** -quantity_scale,
+    the smallest decimals tick and step have, so snapping and validating an order is a
+    handful of integer operations and exact for any tick, 0.05 as well as 0.01.
+    """
+
+    __slots__ = ("tick_size", "step_size", "min_notional_size", "price_scale", "quantity_scale", "tick", "step",
+                 "min_notional")
+
+    def __init__(self, tick_size: Decimal, step_size: Decimal, min_notional: Optional[Decimal] = None):
+        self.tick_size = tick_size.normalize()
+        self.step_size = step_size.normalize()
+        self.min_notional_size = min_notional or Decimal(0)
+        self.price_scale = max(0, -self.tick_size.as_tuple().exponent)
+        self.quantity_scale = max(0, -self.step_size.as_tuple().exponent)
+        self.tick = int(self.tick_size.scaleb(self.price_scale))
+        self.step = int(self.step_size.scaleb(self.quantity_scale))
+        # in price units times quantity units
+        self.min_notional = int(self.min_notional_size.scaleb(self.price_scale + self.quantity_scale)
+                                .to_integral_value(ROUND_CEILING))
+
+    @staticmethod
+    def for_market(tick_size: Optional[Decimal], step_size: Optional[Decimal], min_notional: Optional[Decimal],
+                   base_precision: int, quote_precision: int) -> "MarketFilter":
+        # markets synced before their filters were known fall back to the currency precision
+        return MarketFilter(
+            tick_size=tick_size or Decimal(1).scaleb(-quote_precision),
+            step_size=step_size or Decimal(1).scaleb(-base_precision),
+            min_notional=min_notional,
+        )
+
+    def price_units(self, price: Decimal, round_up: bool = False) -> int:
+        """
+        ``price`` on the tick grid, rounded down or up to the nearest tick.
+        """
+        units = int(price.scaleb(self.price_scale).to_integral_value(ROUND_CEILING if round_up else ROUND_FLOOR))
+        if round_up:
+            return -(-units // self.tick) * self.tick
+        return units // self.tick * self.tick
+
+    def quantity_units(self, amount: Decimal) -> int:
+        """
+        ``amount`` rounded down to the step, an order never grows by rounding.
+        """
+        units = int(amount.scaleb(self.quantity_scale).to_integral_value(ROUND_FLOOR))
+        return units // self.step * self.step
+
+    def format_price(self, units: int) -> str:
+        return format(Decimal(units).scaleb(-self.price_scale), "f")
+
+    def format_quantity(self, units: int) -> str:
+        return format(Decimal(units).scaleb(-self.quantity_scale), "f")
+
+    def validate(self, price_units: int, quantity_units: int):
+        if price_units <= 0:
+            raise OrderFilterError("price_below_tick", f"price is below the tick size {self.tick_size}")
+        if quantity_units <= 0:
+            raise OrderFilterError("quantity_below_step", f"quantity is below the step size {self.step_size}")
+        if price_units * quantity_units < self.min_notional:
+            raise OrderFilterError("notional_below_minimum",
+                                   f"order value is below the minimum notional {self.min_notional_size}")
+
+    def apply(self, price: Decimal, amount: Decimal, sell: bool) -> tuple:
+        """
+        Snaps an order to the filters, sells rounding up and buys down so rounding never
+        makes an order more aggressive, and validates it. Returns the price and quantity
+        units, raises ``OrderFilterError`` for an order the exchange would reject.
+        """
+        price_units = self.price_units(price, round_up=sell)
+        quantity_units = self.quantity_units(amount)
+        self.validate(price_units, quantity_units)
+        return price_units, quantity_units
@@ -0,0 +1,198 @@
+import bisect
+import functools
+import ipaddress
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.db import connection
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class Histogram:
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Process-wide counters and histograms rendered in the Prometheus text format. Recording
+    is a dictionary lookup and a few additions under one lock. Every process has its own,
+    so the daemons serve theirs with ``serve_metrics``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+        self._gauge_collectors = []
+
+    def observe(self, name: str, value, buckets: tuple = LATENCY_BUCKETS, **labels):
+        key = (name, tuple(sorted((label, str(value)) for label, value in labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def increment(self, name: str, value=1, **labels):
+        key = (name, tuple(sorted((label, str(value)) for label, value in labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def register_gauges(self, collector):
+        """
+        ``collector`` returns ``{(name, labels tuple): value}`` and is called on every render.
+        """
+        self._gauge_collectors.append(collector)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def render(self) -> str:
+        with self._lock:
+            histograms = {key: (list(histogram.counts), histogram.sum, histogram.count, histogram.buckets)
+                          for key, histogram in self._histograms.items()}
+            counters = dict(self._counters)
+        gauges = {}
+        for collector in self._gauge_collectors:
+            gauges.update(collector())
+
+        lines = []
+        for metric_type, values in (("counter", counters), ("gauge", gauges)):
+            for name in sorted({name for name, _ in values}):
+                self._header(lines, name, metric_type)
+                for (metric_name, labels), value in sorted(values.items()):
+                    if metric_name == name:
+                        lines.append(f"{name}{self._labels(labels)} {value}")
+        for name in sorted({name for name, _ in histograms}):
+            self._header(lines, name, "histogram")
+            for (metric_name, labels), (counts, total, count, buckets) in sorted(histograms.items()):
+                if metric_name != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{self._labels(labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_bucket{self._labels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{name}_sum{self._labels(labels)} {total}")
+                lines.append(f"{name}_count{self._labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def _header(self, lines: list, name: str, metric_type: str):
+        if name in self._help:
+            lines.append(f"# HELP {name} {self._help[name]}")
+        lines.append(f"# TYPE {name} {metric_type}")
+
+    @staticmethod
+    def _labels(labels: tuple) -> str:
+        if not labels:
+            return ""
+        escaped = (
+            '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+            for key, value in labels
+        )
+        return "{" + ",".join(escaped) + "}"
+
+
+metrics = MetricsRegistry()
+metrics.describe("exchange_call_seconds", "Latency of exchange interface calls")
+metrics.describe("exchange_errors_total", "Failed exchange interface calls by exchange status")
+metrics.describe("bot_cycle_seconds", "Duration of a grid bot cycle")
+metrics.describe("bot_cycle_queries", "Database queries run by a grid bot cycle")
+
+
+def instrument_exchange_call(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        except Exception as exception:
+            metrics.increment("exchange_errors_total", exchange=type(self).__name__, method=method.__name__,
+                              status=getattr(exception, "status", None) or type(exception).__name__)
+            raise
+        finally:
+            metrics.observe("exchange_call_seconds", time.perf_counter() - started, exchange=type(self).__name__,
+                            method=method.__name__)
+    return wrapper
+
+
+@contextmanager
+def record_bot_cycle(*bot_ids: int):
+    queries = [0]
+
+    def count_queries(execute, sql, params, many, context):
+        queries[0] += 1
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        with connection.execute_wrapper(count_queries):
+            yield
+    finally:
+        # bots sharing a cycle are each observed with its duration and queries
+        seconds = time.perf_counter() - started
+        for bot_id in bot_ids:
+            metrics.observe("bot_cycle_seconds", seconds, bot=bot_id)
+            metrics.observe("bot_cycle_queries", queries[0], buckets=QUERY_BUCKETS, bot=bot_id)
+
+
+def metrics_allowed(address: str) -> bool:
+    """
+    Whether ``address`` is in ``METRICS_ALLOWED_IPS``, a list of addresses and networks.
+    """
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(allowed, strict=False)
+               for allowed in getattr(settings, "METRICS_ALLOWED_IPS", ["127.0.0.1", "::1"]))
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        if not metrics_allowed(self.client_address[0]):
+            self.send_error(403)
+            return
+        body = metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port: int, address: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Serves this process's metrics on ``http://<address>:<port>/metrics`` from a daemon thread.
+    """
+    server = ThreadingHTTPServer((address, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    return server
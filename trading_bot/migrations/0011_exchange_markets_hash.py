@@ -0,0 +1,24 @@
+# Generated by Django 4.1.4 on 2026-10-18 15:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading_bot', '0010_order_remote_id_alter_order_state_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exchange',
+            name='markets_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='grid_bot',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='bot_orders', to='trading_bot.gridbot'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.4 on 2026-10-18 15:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading_bot', '0011_exchange_markets_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='market',
+            name='step_size',
+            field=models.DecimalField(blank=True, decimal_places=8, max_digits=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='market',
+            name='tick_size',
+            field=models.DecimalField(blank=True, decimal_places=8, max_digits=32, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.4 on 2026-10-18 15:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading_bot', '0012_market_tick_size_step_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gridbot',
+            name='spacing',
+            field=models.SmallIntegerField(choices=[(1, 'Arithmetic'), (2, 'Geometric')], default=1),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.4 on 2026-10-18 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading_bot', '0013_gridbot_spacing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gridbot',
+            name='cycle_interval',
+            field=models.PositiveIntegerField(default=30, help_text='seconds between two bot cycles'),
+        ),
+    ]
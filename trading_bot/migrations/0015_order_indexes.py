@@ -0,0 +1,33 @@
+# Generated by Django 4.1.4 on 2026-10-18 15:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading_bot', '0014_gridbot_cycle_interval'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['grid_bot', 'state'], name='order_grid_bot_state_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['account', 'market', 'state'], name='order_account_market_state_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['account', 'remote_id'], name='order_account_remote_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('state__in', [2, 3])), fields=['grid_bot'], name='order_grid_bot_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('state', 1)), fields=['grid_bot'], name='order_grid_bot_to_submit_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.4 on 2026-10-18 15:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading_bot', '0015_order_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exchange',
+            name='exchange_provider',
+            field=models.SmallIntegerField(choices=[(1, 'Tabdeal'), (2, 'Simulator')], unique=True),
+        ),
+    ]
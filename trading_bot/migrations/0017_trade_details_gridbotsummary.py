@@ -0,0 +1,53 @@
+# Generated by Django 4.1.4 on 2026-10-18 15:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading_bot', '0016_exchange_provider_simulator'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trade',
+            name='amount',
+            field=models.DecimalField(decimal_places=8, default=0, max_digits=32),
+        ),
+        migrations.AddField(
+            model_name='trade',
+            name='executed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='trade',
+            name='fee',
+            field=models.DecimalField(decimal_places=8, default=0, max_digits=32),
+        ),
+        migrations.AddField(
+            model_name='trade',
+            name='price',
+            field=models.DecimalField(decimal_places=8, default=0, max_digits=32),
+        ),
+        migrations.CreateModel(
+            name='GridBotSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('realized_pnl', models.DecimalField(decimal_places=8, default=0, max_digits=32)),
+                ('average_entry_price', models.DecimalField(decimal_places=8, default=0, max_digits=32)),
+                ('base_position', models.DecimalField(decimal_places=8, default=0, max_digits=32)),
+                ('quote_position', models.DecimalField(decimal_places=8, default=0, max_digits=32)),
+                ('fees', models.DecimalField(decimal_places=8, default=0, max_digits=32)),
+                ('fill_count', models.PositiveIntegerField(default=0)),
+                ('grid_bot', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='summary', to='trading_bot.gridbot')),
+            ],
+            options={
+                'verbose_name_plural': 'grid bot summaries',
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.1.4 on 2026-10-18 15:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading_bot', '0017_trade_details_gridbotsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderRetry',
+            fields=[
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='retry', serialize=False, to='trading_bot.order')),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error_code', models.CharField(max_length=32)),
+                ('error_status', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('error_message', models.CharField(blank=True, max_length=255)),
+                ('next_attempt_at', models.DateTimeField(blank=True, null=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='orderretry',
+            index=models.Index(condition=models.Q(('next_attempt_at__isnull', False)), fields=['next_attempt_at'], name='order_retry_due_idx'),
+        ),
+    ]
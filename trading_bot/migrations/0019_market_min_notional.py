@@ -0,0 +1,18 @@
+# Generated by Django 4.1.4 on 2026-10-18 15:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading_bot', '0018_order_retry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='market',
+            name='min_notional',
+            field=models.DecimalField(blank=True, decimal_places=8, max_digits=32, null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.4 on 2026-10-18 15:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading_bot', '0019_market_min_notional'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('state__in', [4, 5, 6, 7])), fields=['updated'], name='order_terminal_updated_idx'),
+        ),
+    ]
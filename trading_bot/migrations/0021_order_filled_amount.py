@@ -0,0 +1,18 @@
+# Generated by Django 4.1.4 on 2026-10-18 15:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading_bot', '0020_order_terminal_updated_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='filled_amount',
+            field=models.DecimalField(decimal_places=8, default=0, max_digits=32),
+        ),
+    ]
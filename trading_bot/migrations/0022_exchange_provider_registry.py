@@ -0,0 +1,18 @@
+# Generated by Django 4.1.4 on 2026-10-18 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading_bot', '0021_order_filled_amount'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exchange',
+            name='exchange_provider',
+            field=models.SmallIntegerField(unique=True),
+        ),
+    ]
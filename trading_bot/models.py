@@ -1,24 +1,49 @@
-import traceback
+import logging
 from abc import ABC, abstractmethod
-from enum import Enum
-
-from django.db import models
+from collections import defaultdict
+from decimal import Decimal
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.utils import timezone
+
+from trading_bot.exchange_registry import exchange_providers
+from trading_bot.grid_planner import GridPlanner
+from trading_bot.market_cache import market_cache
+from trading_bot.metrics import instrument_exchange_call, record_bot_cycle
+from trading_bot.order_payload import OrderPayload, order_payloads
+from trading_bot.retry_policy import classify_error, retry_policy
+from trading_bot.streaming import ExchangeStream, StreamView, order_streams
+from utils import bases as utils_bases
 
-from rest_framework import serializers
+logger = logging.getLogger(__name__)
 
-from tabdeal.spot import Spot
-from tabdeal.enums import OrderSides, OrderTypes
 
-from utils import bases as utils_bases
+class RemoteOrderState(NamedTuple):
+    state: int
+    # cumulative executed quantity, None when the exchange did not say
+    filled_amount: Optional[Decimal] = None
 
 
 class BaseExchangeInterFace(ABC):
+    instrumented_methods = ["get_and_update_markets", "submit_order", "update_order_state", "get_orders_state",
+                            "cancel_order", "cancel_open_orders", "find_order", "get_last_price"]
+    # whether cancel_open_orders is backed by a single cancel-all request
+    cancel_all_supported = False
 
     def __init__(self, api_key: None, api_secret: None):
         self.api_key = api_key
         self.api_secret = api_secret
         super().__init__()
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for method_name in cls.instrumented_methods:
+            if method_name in cls.__dict__:
+                setattr(cls, method_name, instrument_exchange_call(cls.__dict__[method_name]))
+
     @abstractmethod
     def get_client(self):
         raise NotImplementedError
@@ -28,92 +53,37 @@ class BaseExchangeInterFace(ABC):
         raise NotImplementedError
 
     @abstractmethod
-    def submit_order(self, order_dict: dict) -> int:
+    def submit_order(self, payload: OrderPayload) -> int:
         raise NotImplementedError
 
     @abstractmethod
     def update_order_state(self, order_id: int):
         raise NotImplementedError
 
+    @abstractmethod
+    def get_orders_state(self, market, remote_ids) -> dict:
+        raise NotImplementedError
 
-class Tabdeal(BaseExchangeInterFace):
-
-    def get_client(self):
-        return Spot(self.api_key, self.api_secret)
-
-    def get_and_update_markets(self, exchange_db_instance):
-        client = self.get_client()
-        markets = client.exchange_info()
-        markets_id = []
-        for market in markets:
-            first_currency, _ = Currency.objects.get_or_create(symbol=market['baseAsset'])
-            second_currency, _ = Currency.objects.get_or_create(symbol=market['quoteAsset'])
-            markets_id.append(
-                Market.objects.get_or_create(first_currency=first_currency,
-                                             second_currency=second_currency)[0].id)
-        exchange_db_instance.markets.add(*markets_id)
-
-    def submit_order(self, order_dict: dict) -> int:
-        client = self.get_client()
-        order_side = OrderSides.SELL if order_dict.get(
-            "side") == Order.Side.Sell.value else OrderSides.BUY
-        market = Market.objects.get(id=order_dict.get("market"))
-        order = client.new_order(
-            symbol=f"{market.first_currency}{market.second_currency}",
-            side=order_side,
-            type=OrderTypes.LIMIT,
-            quantity=order_dict.get("amount"),
-            price=order_dict.get("price")
-        )
-        return int(order['orderId'])
-
-    def update_order_state(self, order_id: int) -> None:
-        client = self.get_client()
-        db_order = Order.objects.get(id=order_id)
-        remote_order = client.get_order(
-            symbol=f"{db_order.market.first_currency.symbol}_{db_order.market.second_currency.symbol}",
-            order_id=db_order.remote_id
-        )
-        order_state = remote_order['status']
-        if order_state == "NEW":
-            db_order.state = Order.State.Waiting.value
-        elif order_state == "FILED":
-            db_order.state = Order.State.Filled.value
-        elif order_state == "PARTIALLY_FILLED":
-            db_order.state = Order.State.PartiallyFilled.value
-        elif order_state == "PARTIALLY_FILLED_AND_FINISHED":
-            db_order.state = Order.State.PartiallyFilledAndFinished.value
-        elif order_state == "ERROR":
-            db_order.state = Order.State.Error.value
-        elif order_state == "CANCELED":
-            db_order.state = Order.State.Canceled.value
-        else:
-            db_order.state = Order.State.Idle.value
-
-        db_order.save(update_fields=["state", "updated"])
-
-
-class ExchangeProviders(Enum):
-
-    def __new__(cls, *args, **kwargs):
-        obj = object.__new__(cls)
-        obj._value_ = args[0]
-        return obj
+    def cancel_order(self, market, remote_id: int) -> RemoteOrderState:
+        raise NotImplementedError
 
-    def __init__(self, value: str, exchange_class):
-        self._exchange_class = exchange_class
+    def cancel_open_orders(self, market) -> dict:
+        raise NotImplementedError
 
-    @property
-    def exchange_class(self):
-        return self._exchange_class
+    def find_order(self, market, client_order_id: str) -> Optional[int]:
+        """
+        Remote id of the order placed with ``client_order_id``, ``None`` when there is none.
+        """
+        raise NotImplementedError
 
-    Tabdeal = 1, Tabdeal
+    def get_last_price(self, market) -> Optional[Decimal]:
+        raise NotImplementedError
 
+    def open_stream(self, symbols=()) -> ExchangeStream:
+        raise NotImplementedError
 
-class Choices:
-    exchange_providers = (
-        (ExchangeProviders.Tabdeal.value, ExchangeProviders.Tabdeal.name),
-    )
+    def apply_stream_event(self, event: dict, view: StreamView) -> None:
+        raise NotImplementedError
 
 
 class Currency(utils_bases.BaseModel):
@@ -132,6 +102,9 @@ class Market(utils_bases.BaseModel):
                                        related_name="first_currencies")
     second_currency = models.ForeignKey('trading_bot.Currency', on_delete=models.PROTECT,
                                         related_name="second_currencies")
+    tick_size = models.DecimalField(max_digits=32, decimal_places=8, null=True, blank=True)
+    step_size = models.DecimalField(max_digits=32, decimal_places=8, null=True, blank=True)
+    min_notional = models.DecimalField(max_digits=32, decimal_places=8, null=True, blank=True)
 
     def __str__(self):
         return f"{self.first_currency}@{self.second_currency}"
@@ -139,18 +112,24 @@ class Market(utils_bases.BaseModel):
 
 class Exchange(utils_bases.BaseModel):
     markets = models.ManyToManyField('trading_bot.Market', related_name="exchanges")
-    exchange_provider = models.SmallIntegerField(choices=Choices.exchange_providers, unique=True)
+    # validated against the registry in clean(), choices would put every provider in the migrations
+    exchange_provider = models.SmallIntegerField(unique=True)
+    markets_hash = models.CharField(max_length=64, blank=True, default="")
+
+    def clean(self):
+        super().clean()
+        if self.exchange_provider is not None and self.exchange_provider not in exchange_providers:
+            raise ValidationError({"exchange_provider": f"unknown exchange provider {self.exchange_provider}"})
 
     def exchange_interface(self, api_key=None, api_secret=None):
-        return ExchangeProviders(self.exchange_provider).exchange_class(api_key=api_key,
-                                                                        api_secret=api_secret)
+        return exchange_providers.exchange_class(self.exchange_provider)(api_key=api_key, api_secret=api_secret)
 
     def get_and_update_markets(self):
         self.exchange_interface().get_and_update_markets(exchange_db_instance=self)
 
-    def submit_order(self, order_dict: dict, account) -> int:
+    def submit_order(self, payload: OrderPayload, account) -> int:
         order_id = self.exchange_interface(api_key=account.api_key, api_secret=account.api_secret).submit_order(
-            order_dict)
+            payload)
         return order_id
 
     def update_order_state(self, order_id: int, account) -> None:
@@ -158,8 +137,40 @@ class Exchange(utils_bases.BaseModel):
             order_id=order_id
         )
 
+    def get_orders_state(self, market, remote_ids, account) -> dict:
+        return self.exchange_interface(api_key=account.api_key, api_secret=account.api_secret).get_orders_state(
+            market=market, remote_ids=remote_ids
+        )
+
+    @property
+    def cancel_all_supported(self) -> bool:
+        return exchange_providers.exchange_class(self.exchange_provider).cancel_all_supported
+
+    def cancel_order(self, market, remote_id: int, account) -> RemoteOrderState:
+        return self.exchange_interface(api_key=account.api_key, api_secret=account.api_secret).cancel_order(
+            market=market, remote_id=remote_id
+        )
+
+    def cancel_open_orders(self, market, account) -> dict:
+        return self.exchange_interface(api_key=account.api_key, api_secret=account.api_secret).cancel_open_orders(
+            market=market
+        )
+
+    def find_order(self, market, client_order_id: str, account) -> Optional[int]:
+        return self.exchange_interface(api_key=account.api_key, api_secret=account.api_secret).find_order(
+            market=market, client_order_id=client_order_id
+        )
+
+    def get_last_price(self, market, account) -> Optional[Decimal]:
+        return self.exchange_interface(api_key=account.api_key, api_secret=account.api_secret).get_last_price(
+            market=market
+        )
+
     def __str__(self):
-        return ExchangeProviders(self.exchange_provider).name
+        # a provider removed from the registry still has its rows, show them by id
+        if self.exchange_provider not in exchange_providers:
+            return str(self.exchange_provider)
+        return exchange_providers.name(self.exchange_provider)
 
 
 class Account(utils_bases.BaseModel):
@@ -190,6 +201,11 @@ class Order(utils_bases.BaseModel):
         def active_states():
             return [Order.State.Waiting.value, Order.State.PartiallyFilled.value]
 
+        @staticmethod
+        def terminal_states():
+            return [Order.State.PartiallyFilledAndFinished.value, Order.State.Filled.value,
+                    Order.State.Canceled.value, Order.State.Error.value]
+
     exchange = models.ForeignKey('trading_bot.Exchange', on_delete=models.PROTECT)
     grid_bot = models.ForeignKey('trading_bot.GridBot', on_delete=models.PROTECT, related_name="bot_orders")
     account = models.ForeignKey('trading_bot.Account', on_delete=models.PROTECT)
@@ -199,35 +215,286 @@ class Order(utils_bases.BaseModel):
     side = models.SmallIntegerField(choices=Side.choices)
     remote_id = models.PositiveBigIntegerField(null=True, blank=True)
     state = models.SmallIntegerField(choices=State.choices, default=State.WaitingToSubmit.value)
+    filled_amount = models.DecimalField(max_digits=32, decimal_places=8, default=0)
     comments = models.TextField(null=True, blank=True)
 
     class Meta:
         unique_together = ['remote_id', 'exchange']
+        indexes = [
+            models.Index(fields=["grid_bot", "state"], name="order_grid_bot_state_idx"),
+            models.Index(fields=["account", "market", "state"], name="order_account_market_state_idx"),
+            models.Index(fields=["account", "remote_id"], name="order_account_remote_id_idx"),
+            # partial indexes on Waiting/PartiallyFilled and WaitingToSubmit stay as small as the
+            # set of live orders, databases without partial index support skip them
+            models.Index(fields=["grid_bot"], name="order_grid_bot_active_idx",
+                         condition=models.Q(state__in=[2, 3])),
+            models.Index(fields=["grid_bot"], name="order_grid_bot_to_submit_idx",
+                         condition=models.Q(state=1)),
+            # terminal orders by age, for the archival that keeps them out of the table
+            models.Index(fields=["updated"], name="order_terminal_updated_idx",
+                         condition=models.Q(state__in=[4, 5, 6, 7])),
+        ]
 
     def submit_order(self):
+        self.save(update_fields=self.send_to_exchange())
+        OrderRetry.schedule_failed([self])
+
+    def send_to_exchange(self, payload: OrderPayload = None) -> list:
+        """
+        Submit the order to the exchange and apply the outcome to this instance without
+        saving it. Returns the fields that have to be persisted, a failure is kept in
+        ``submit_error`` for ``OrderRetry.schedule_failed``.
+        """
+        self.submit_error = None
         try:
-            order_dict = OrderSerializer(instance=self).data
-            order_remote_id = self.exchange.submit_order(order_dict=order_dict, account=self.account)
+            payload = payload or order_payloads.build(self)
+            order_remote_id = None
+            # a failed attempt may still have placed the order, sending it again would be rejected
+            # as a duplicate client order id and leave the placed one untracked
+            if self.state == Order.State.Error.value and payload.client_order_id:
+                try:
+                    order_remote_id = self.exchange.find_order(market=self.market,
+                                                               client_order_id=payload.client_order_id,
+                                                               account=self.account)
+                except NotImplementedError:
+                    pass
+            if order_remote_id is None:
+                order_remote_id = self.exchange.submit_order(payload=payload, account=self.account)
             self.state = Order.State.Waiting.value
             self.remote_id = order_remote_id
-            self.save(update_fields=["state", "remote_id", "updated"])
+            return ["state", "remote_id", "updated"]
         except Exception as ve:
             self.state = Order.State.Error.value
-            self.comments = ve.__str__() + "\n" + str(traceback.format_exc()) + "\n"
-            self.save(update_fields=["state", 'comments', 'updated'])
+            self.submit_error = ve
+            return ["state", "updated"]
 
     def update_order_state(self):
-        self.exchange.update_order_state(order_id=self.id, account=self.account)
-
+        Order.update_orders_state(Order.objects.filter(id=self.id))
+
+    def apply_remote_state(self, remote_state: RemoteOrderState) -> bool:
+        """
+        Apply the exchange's view of the order in memory. The state and executed amount
+        loaded from the database are kept in ``loaded_state`` and ``booked_amount`` for
+        ``save_orders_state`` and ``GridBot.record_fills``. Returns whether the state or the
+        executed amount changed.
+        """
+        self.loaded_state = self.state
+        self.booked_amount = self.filled_amount
+        filled_amount = remote_state.filled_amount
+        if filled_amount is None:
+            filled_amount = self.amount if remote_state.state == Order.State.Filled.value else self.filled_amount
+        changed = remote_state.state != self.state or filled_amount != self.filled_amount
+        self.state = remote_state.state
+        self.filled_amount = filled_amount
+        return changed
+
+    @staticmethod
+    def fetch_orders_state(orders) -> list:
+        """
+        Reconcile the given orders with the exchange using one open orders query per
+        account/market and one lookup per order that left the open orders, or from the
+        account's stream while it is connected and has seen every order. The new states
+        and executed amounts are applied in memory only, the orders that changed are
+        returned.
+        """
+        orders_by_account_market = defaultdict(list)
+        for order in orders.filter(remote_id__isnull=False).select_related("exchange", "account", "market"):
+            orders_by_account_market[(order.account_id, order.market_id)].append(order)
+
+        changed_orders = []
+        for account_orders in orders_by_account_market.values():
+            first_order = account_orders[0]
+            stream = order_streams.get(first_order.account_id)
+            connected_since = stream.connected_since if stream is not None else None
+            if connected_since is not None and all(order.remote_id in stream.view.order_states
+                                                   or order.updated.timestamp() >= connected_since
+                                                   for order in account_orders):
+                # no event since the stream connected means the order did not change
+                remote_states = {order.remote_id: stream.view.order_state(order.remote_id)
+                                 for order in account_orders}
+            else:
+                remote_states = first_order.exchange.get_orders_state(
+                    market=first_order.market,
+                    remote_ids={order.remote_id for order in account_orders},
+                    account=first_order.account
+                )
+                if connected_since is not None:
+                    stream.view.seed_order_states(remote_states)
+            for order in account_orders:
+                remote_state = remote_states.get(order.remote_id)
+                if remote_state is not None and order.apply_remote_state(remote_state):
+                    changed_orders.append(order)
+        return changed_orders
+
+    @staticmethod
+    def save_orders_state(changed_orders) -> list:
+        """
+        Save reconciled orders, returns the ones saved. Must run in a transaction: the rows
+        are locked and an order another reconciliation saved since this one loaded it is
+        left out, so its fills are booked only once.
+        """
+        if not changed_orders:
+            return []
+        loaded = {row["id"]: (row["state"], row["filled_amount"]) for row in
+                  Order.objects.select_for_update().filter(id__in=[order.id for order in changed_orders])
+                  .order_by("id").values("id", "state", "filled_amount")}
+        saved_orders = [order for order in changed_orders
+                        if loaded.get(order.id) == (order.loaded_state, order.booked_amount)]
+        if len(saved_orders) < len(changed_orders):
+            logger.info("%s orders were reconciled concurrently and are skipped",
+                        len(changed_orders) - len(saved_orders))
+        now = timezone.now()
+        for order in saved_orders:
+            order.updated = now
+        Order.objects.bulk_update(saved_orders, fields=["state", "filled_amount", "updated"])
+        GridBot.touch({order.grid_bot_id for order in saved_orders})
+        # ended orders are never reconciled again, the streams stop tracking them once saved
+        ended_remote_ids = defaultdict(list)
+        for order in saved_orders:
+            if order.state in Order.State.terminal_states():
+                ended_remote_ids[order.account_id].append(order.remote_id)
+        if ended_remote_ids:
+            transaction.on_commit(lambda: order_streams.forget_order_states(ended_remote_ids))
+        return saved_orders
+
+    @staticmethod
+    def update_orders_state(orders) -> list:
+        """
+        Reconcile orders of any bots and book their fills the way the bot cycle does.
+        """
+        changed_orders = Order.fetch_orders_state(orders)
+        with transaction.atomic():
+            changed_orders = Order.save_orders_state(changed_orders)
+            orders_by_bot = defaultdict(list)
+            for order in changed_orders:
+                orders_by_bot[order.grid_bot_id].append(order)
+            for grid_bot in GridBot.objects.filter(id__in=orders_by_bot.keys()):
+                grid_bot.handle_fills(orders_by_bot[grid_bot.id])
+        return changed_orders
+
+
+class OrderRetry(models.Model):
+    """
+    Last submission error of an order and, while it is retryable, when to try again.
+    Kept apart from ``Order`` and free of tracebacks so it stays small and the due
+    retries are one index range scan.
+    """
+    order = models.OneToOneField('trading_bot.Order', on_delete=models.CASCADE, primary_key=True,
+                                 related_name="retry")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error_code = models.CharField(max_length=32)
+    error_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    error_message = models.CharField(max_length=255, blank=True)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    updated = models.DateTimeField(auto_now=True)
 
-class OrderSerializer(serializers.ModelSerializer):
     class Meta:
-        model = Order
-        fields = ["price", "amount", "side", "market"]
+        indexes = [
+            models.Index(fields=["next_attempt_at"], name="order_retry_due_idx",
+                         condition=models.Q(next_attempt_at__isnull=False)),
+        ]
+
+    @staticmethod
+    def schedule_failed(orders) -> list:
+        """
+        Record the ``submit_error`` of the given orders, scheduling the next attempt of
+        retryable ones. Fatal and unknown errors are logged with their traceback and not
+        retried.
+        """
+        failed_orders = [order for order in orders if getattr(order, "submit_error", None) is not None]
+        if not failed_orders:
+            return []
+
+        now = timezone.now()
+        existing_retries = OrderRetry.objects.in_bulk([order.id for order in failed_orders])
+        new_retries, changed_retries = [], []
+        for order in failed_orders:
+            error = classify_error(order.submit_error)
+            if not error.retryable:
+                logger.error("order %s failed with %s", order.id, error.code, exc_info=order.submit_error)
+            retry = existing_retries.get(order.id)
+            if retry is None:
+                retry = OrderRetry(order=order)
+                new_retries.append(retry)
+            else:
+                changed_retries.append(retry)
+            retry.attempts += 1
+            retry.error_code = error.code
+            retry.error_status = error.status
+            retry.error_message = error.message
+            retry.updated = now
+            retry.next_attempt_at = now + retry_policy.delay(retry.attempts) \
+                if retry_policy.should_retry(error, retry.attempts) else None
+
+        OrderRetry.objects.bulk_create(new_retries)
+        OrderRetry.objects.bulk_update(changed_retries, fields=["attempts", "error_code", "error_status",
+                                                                "error_message", "next_attempt_at", "updated"])
+        return new_retries + changed_retries
 
 
 class Trade(utils_bases.BaseModel):
     order = models.ForeignKey('trading_bot.Order', on_delete=models.PROTECT)
+    price = models.DecimalField(max_digits=32, decimal_places=8, default=0)
+    amount = models.DecimalField(max_digits=32, decimal_places=8, default=0)
+    fee = models.DecimalField(max_digits=32, decimal_places=8, default=0)
+    executed_at = models.DateTimeField(default=timezone.now)
+
+    @staticmethod
+    def from_order(order, amount: Decimal = None) -> "Trade":
+        amount = order.amount if amount is None else amount
+        fee_rate = Decimal(str(getattr(settings, "EXCHANGE_FEE_RATE", 0)))
+        return Trade(order=order, price=order.price, amount=amount, fee=order.price * amount * fee_rate,
+                     executed_at=order.updated or timezone.now())
+
+
+class GridBotSummary(utils_bases.BaseModel):
+    """
+    Running totals of a bot's fills, updated in the transaction that records each fill so
+    reads never have to aggregate the trades. Profit is realized against the average entry
+    price of the base bought by the bot, sells beyond that position realize nothing.
+    """
+    grid_bot = models.OneToOneField('trading_bot.GridBot', on_delete=models.CASCADE, related_name="summary")
+    realized_pnl = models.DecimalField(max_digits=32, decimal_places=8, default=0)
+    average_entry_price = models.DecimalField(max_digits=32, decimal_places=8, default=0)
+    base_position = models.DecimalField(max_digits=32, decimal_places=8, default=0)
+    quote_position = models.DecimalField(max_digits=32, decimal_places=8, default=0)
+    fees = models.DecimalField(max_digits=32, decimal_places=8, default=0)
+    fill_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "grid bot summaries"
+
+    @staticmethod
+    def apply_trades(grid_bot_id: int, trades) -> "GridBotSummary":
+        summary, _ = GridBotSummary.objects.select_for_update().get_or_create(grid_bot_id=grid_bot_id)
+        for trade in trades:
+            summary.apply_trade(trade.order.side, trade.price, trade.amount, trade.fee)
+        summary.save()
+        return summary
+
+    def apply_trade(self, side: int, price: Decimal, amount: Decimal, fee: Decimal):
+        """
+        Roll one fill into the totals in memory, shared with ``GridBacktest``.
+        """
+        cost = price * amount
+        if side == Order.Side.Buy.value:
+            if self.base_position > 0:
+                self.average_entry_price = (self.average_entry_price * self.base_position + cost) / \
+                                           (self.base_position + amount)
+            else:
+                self.average_entry_price = price
+            self.base_position += amount
+            self.quote_position -= cost + fee
+            self.realized_pnl -= fee
+        else:
+            matched_amount = min(amount, max(self.base_position, 0))
+            self.realized_pnl += (price - self.average_entry_price) * matched_amount - fee
+            self.base_position -= amount
+            self.quote_position += cost - fee
+            if self.base_position <= 0:
+                self.average_entry_price = 0
+        self.fees += fee
+        self.fill_count += 1
 
 
 class Bot(utils_bases.BaseModel):
@@ -240,43 +507,163 @@ class Bot(utils_bases.BaseModel):
 
 
 class GridBot(Bot):
+    class Spacing(models.IntegerChoices):
+        Arithmetic = 1
+        Geometric = 2
+
     no_grid_lines = models.IntegerField()
     upper_price = models.DecimalField(max_digits=32, decimal_places=8)
     lower_price = models.DecimalField(max_digits=32, decimal_places=8)
     active = models.BooleanField(default=True)
+    spacing = models.SmallIntegerField(choices=Spacing.choices, default=Spacing.Arithmetic.value)
+    cycle_interval = models.PositiveIntegerField(default=30, help_text="seconds between two bot cycles")
 
     @property
     def position_distance(self):
         return (self.upper_price - self.lower_price) / self.no_grid_lines
 
-    @property
-    def position_value(self):
-        return self.investment / (self.no_grid_lines // 2)
-
-    def create_orders(self):
-        orders_list = []
-        for i in range(self.no_grid_lines // 2):
-            price = self.lower_price + (i * self.position_distance)
-            orders_list.append(Order(
-                side=Order.Side.Buy.value,
-                price=price,
-                amount=round(self.position_value / price, self.market.first_currency.precision),
+    def clean(self):
+        super().clean()
+        if self.market_id is None or None in (self.lower_price, self.upper_price, self.no_grid_lines):
+            return
+        try:
+            self.grid_planner()
+        except ValueError as error:
+            raise ValidationError(str(error))
+
+    def grid_planner(self) -> GridPlanner:
+        market_filter = market_cache.get(self.market_id).market_filter
+        return GridPlanner(
+            lower_price=self.lower_price,
+            upper_price=self.upper_price,
+            no_grid_lines=self.no_grid_lines,
+            investment=self.investment,
+            tick_size=market_filter.tick_size,
+            step_size=market_filter.step_size,
+            min_notional=market_filter.min_notional_size,
+            geometric=self.spacing == GridBot.Spacing.Geometric.value
+        )
+
+    def current_price(self) -> Optional[Decimal]:
+        """
+        Last traded price of the bot's market, from the account's stream while it is
+        connected and has seen a trade, otherwise from the exchange.
+        """
+        stream = order_streams.get(self.account_id)
+        if stream is not None and stream.connected_since is not None:
+            last_price = stream.view.last_price(market_cache.get(self.market_id).symbol)
+            if last_price is not None:
+                return last_price
+        return self.account.exchange.get_last_price(market=self.market, account=self.account)
+
+    def create_orders(self, current_price: Decimal = None):
+        """
+        Place the grid around ``current_price``, the market's last price when not given.
+        """
+        if current_price is None:
+            current_price = self.current_price()
+            if current_price is None:
+                raise ValueError(f"no last price is known for the market of bot {self.id}")
+        exchange_id = self.account.exchange_id
+        orders_list = [
+            Order(
+                side=level.side,
+                price=level.price,
+                amount=level.amount,
                 grid_bot=self,
-                exchange=self.account.exchange,
-                account=self.account,
-                market=self.market
-            ))
+                exchange_id=exchange_id,
+                account_id=self.account_id,
+                market_id=self.market_id
+            )
+            for level in self.grid_planner().plan(current_price=current_price, buy_side=Order.Side.Buy.value)
+        ]
         Order.objects.bulk_create(objs=orders_list)
 
     def check_and_update_order_state_and_create_new_order_if_needed(self):
-        bot_orders = self.bot_orders.exclude(state__in=Order.State.active_states())
-        for order in bot_orders:
-            order.update_order_state()
-            order.refresh_from_db()
-            if order.state in [Order.State.Filled.value, Order.State.PartiallyFilled.value] and order.trade is None:
-                pass
-
-
+        # only orders still active on the exchange are polled, so every change is a new transition
+        with record_bot_cycle(self.id):
+            changed_orders = Order.fetch_orders_state(self.bot_orders.filter(state__in=Order.State.active_states()))
+            with transaction.atomic():
+                changed_orders = Order.save_orders_state(changed_orders)
+                self.handle_fills(changed_orders)
+        return changed_orders
+
+    @staticmethod
+    def touch(grid_bot_ids):
+        """
+        Bump ``updated`` of bots whose orders changed, it is the read API's validator.
+        """
+        if grid_bot_ids:
+            GridBot.objects.filter(id__in=grid_bot_ids).update(updated=timezone.now())
+
+    @staticmethod
+    def check_and_update_bots(bot_ids) -> list:
+        """
+        The cycle of several bots at once: the active orders of all of them are reconciled
+        together, so bots sharing an account and market make one set of exchange requests,
+        and the fills are then handled per bot.
+        """
+        with record_bot_cycle(*bot_ids):
+            return Order.update_orders_state(
+                Order.objects.filter(grid_bot_id__in=bot_ids, state__in=Order.State.active_states()))
+
+    def handle_fills(self, changed_orders) -> list:
+        """
+        Book what the changed orders executed since they were last seen and, for every order
+        that finished with something executed, queue the opposite order one grid level away
+        with the executed amount. A level that already holds an order of the bot is left
+        alone, and a stopped bot places no counter orders. Must run in the transaction that
+        saves the orders.
+        """
+        self.record_fills(changed_orders)
+        finished_states = (Order.State.Filled.value, Order.State.PartiallyFilledAndFinished.value)
+        finished_orders = [order for order in changed_orders
+                           if order.state in finished_states and order.filled_amount > 0]
+        if not finished_orders or not self.active:
+            return []
+        occupied_prices = set(self.bot_orders.filter(
+            state__in=Order.State.active_states() + [Order.State.WaitingToSubmit.value]
+        ).values_list("price", flat=True))
+        levels = self.grid_planner().counter_levels(
+            [(order.side, order.price, order.filled_amount) for order in finished_orders], occupied_prices,
+            buy_side=Order.Side.Buy.value, sell_side=Order.Side.Sell.value
+        )
+        first_order = finished_orders[0]
+        counter_orders = [
+            Order(
+                side=level.side,
+                price=level.price,
+                amount=level.amount,
+                grid_bot_id=self.id,
+                exchange_id=first_order.exchange_id,
+                account_id=first_order.account_id,
+                market_id=first_order.market_id
+            )
+            for level in levels
+        ]
+        Order.objects.bulk_create(counter_orders)
+        return counter_orders
+
+    def record_fills(self, orders) -> list:
+        """
+        Record a trade for what each order executed beyond its ``booked_amount`` and roll
+        them into the bot summary, without placing counter orders.
+        """
+        trades = [Trade.from_order(order, order.filled_amount - order.booked_amount) for order in orders
+                  if order.filled_amount > getattr(order, "booked_amount", order.filled_amount)]
+        if not trades:
+            return []
+        Trade.objects.bulk_create(trades)
+        GridBotSummary.apply_trades(self.id, trades)
+        return trades
 
     def deactivate(self):
-        raise NotImplementedError
+        """
+        Stop the bot and cancel its orders, see ``OrderCanceller``. Safe to call again when
+        some orders were left open. Returns the bot's ``CancellationReport``.
+        """
+        # imported here, the canceller is built on these models
+        from trading_bot.order_cancellation import OrderCanceller
+        report, = OrderCanceller().deactivate(GridBot.objects.filter(id=self.id))
+        self.active = False
+        return report
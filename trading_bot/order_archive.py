@@ -0,0 +1,136 @@
+import csv
+import gzip
+import logging
+import os
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from trading_bot import models as trading_bot_models
+
+logger = logging.getLogger(__name__)
+
+# states an order never leaves, Error orders still waiting for a retry are kept
+TERMINAL_STATES = [
+    trading_bot_models.Order.State.PartiallyFilledAndFinished.value,
+    trading_bot_models.Order.State.Filled.value,
+    trading_bot_models.Order.State.Canceled.value,
+    trading_bot_models.Order.State.Error.value,
+]
+
+
+class OrderArchive:
+    """
+    Moves terminal orders older than ``age`` and their trades out of the database into
+    gzip compressed CSV files partitioned by month, ``<directory>/orders/month=2023-01/``
+    and ``<directory>/trades/month=2023-01/``. Every batch adds new part files and never
+    touches existing ones, so the hot order table stays about as large as the set of live
+    orders while the archive only grows.
+
+    Part files are complete before the rows are deleted. A crash in between archives the
+    rows again on the next run into the same month, ``read`` drops such repeated rows.
+    """
+
+    datasets = {
+        "orders": (trading_bot_models.Order, "updated"),
+        "trades": (trading_bot_models.Trade, "executed_at"),
+    }
+
+    def __init__(self, directory: Path = None, age: timedelta = None, batch_size: int = 1000):
+        self.directory = Path(directory or getattr(settings, "ORDER_ARCHIVE_DIR", None)
+                              or Path(settings.BASE_DIR) / "archive")
+        self.age = age if age is not None else timedelta(days=getattr(settings, "ORDER_ARCHIVE_AFTER_DAYS", 30))
+        self.batch_size = batch_size
+
+    def archive(self, now=None) -> int:
+        cutoff = (now or timezone.now()) - self.age
+        archived = 0
+        while True:
+            count = self.archive_batch(cutoff)
+            archived += count
+            if count < self.batch_size:
+                break
+        if archived:
+            logger.info("archived %s orders last updated before %s", archived, cutoff)
+        return archived
+
+    def archive_batch(self, cutoff) -> int:
+        with transaction.atomic():
+            orders = list(
+                trading_bot_models.Order.objects.select_for_update(skip_locked=True, of=("self",))
+                .filter(state__in=TERMINAL_STATES, updated__lt=cutoff)
+                .exclude(retry__next_attempt_at__isnull=False)
+                .order_by("updated")[:self.batch_size]
+            )
+            if not orders:
+                return 0
+            order_ids = [order.id for order in orders]
+            trades = list(trading_bot_models.Trade.objects.filter(order_id__in=order_ids).order_by("id"))
+            self.write("trades", trades)
+            self.write("orders", orders)
+            trading_bot_models.Trade.objects.filter(order_id__in=order_ids).delete()
+            # the retry records of the orders go with them
+            trading_bot_models.Order.objects.filter(id__in=order_ids).delete()
+        return len(orders)
+
+    def write(self, dataset: str, instances: list) -> list:
+        model, partition_field = self.datasets[dataset]
+        fields = model._meta.concrete_fields
+        instances_by_month = defaultdict(list)
+        for instance in instances:
+            instances_by_month[getattr(instance, partition_field).strftime("%Y-%m")].append(instance)
+
+        paths = []
+        for month, month_instances in sorted(instances_by_month.items()):
+            partition = self.directory / dataset / f"month={month}"
+            partition.mkdir(parents=True, exist_ok=True)
+            path = partition / f"part-{timezone.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.csv.gz"
+            temporary_path = path.with_name(f".{path.name}.tmp")
+            # readers only ever see complete parts
+            with open(temporary_path, "wb") as raw_file:
+                with gzip.open(raw_file, "wt", newline="") as file:
+                    writer = csv.writer(file)
+                    writer.writerow([field.attname for field in fields])
+                    for instance in month_instances:
+                        writer.writerow([self.format_value(field.value_from_object(instance)) for field in fields])
+                raw_file.flush()
+                os.fsync(raw_file.fileno())
+            os.replace(temporary_path, path)
+            paths.append(path)
+        return paths
+
+    @staticmethod
+    def format_value(value) -> str:
+        if value is None:
+            return ""
+        if hasattr(value, "isoformat"):
+            return value.isoformat()
+        return str(value)
+
+    def read(self, dataset: str, start_month: str = None, end_month: str = None):
+        """
+        Yields the archived rows of ``dataset`` as dictionaries of typed values, optionally
+        limited to the months ``start_month`` to ``end_month`` given as ``YYYY-MM``.
+        """
+        model, _ = self.datasets[dataset]
+        fields = {field.attname: field for field in model._meta.concrete_fields}
+        for partition in sorted((self.directory / dataset).glob("month=*")):
+            month = partition.name.split("=", 1)[1]
+            if (start_month and month < start_month) or (end_month and month > end_month):
+                continue
+            # a row archived twice lands in the same month both times, so the ids seen are only
+            # kept for one partition at a time
+            seen_ids = set()
+            for path in sorted(partition.glob("part-*.csv.gz")):
+                with gzip.open(path, "rt", newline="") as file:
+                    for row in csv.DictReader(file):
+                        if row["id"] in seen_ids:
+                            continue
+                        seen_ids.add(row["id"])
+                        yield {name: fields[name].to_python(value) if value != "" or not fields[name].null
+                               else None for name, value in row.items()}
@@ -0,0 +1,189 @@
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from trading_bot import models as trading_bot_models
+from trading_bot.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("bot_cancellation_seconds", "Time until every order of a cancelled bot was resolved")
+
+
+class CancellationReport(NamedTuple):
+    grid_bot_id: int
+    canceled: int
+    filled: int
+    partially_filled: int
+    still_open: int
+    seconds: float
+
+
+class OrderCanceller:
+    """
+    Cancels orders on the exchange in parallel and marks them ``Canceled`` with bulk updates.
+
+    Orders that never reached the exchange are cancelled in the database first. With
+    ``cancel_all``, an account and market whose every open bot order is being cancelled
+    takes one cancel-all request when the exchange has one; it also cancels orders placed
+    outside the bots, so it is off by default. Other orders are cancelled one by one on a
+    thread pool. Orders whose outcome is unknown, because their cancel failed or the
+    cancel-all response left them out, are reconciled with the exchange afterwards, so an
+    order that filled or was cancelled by an earlier run ends up in its real state and
+    cancelling again is safe. Orders cancelled after a partial fill are reported apart from
+    both cancelled and filled ones.
+    """
+
+    def __init__(self, max_workers: int = None, cancel_all: bool = None):
+        self.max_workers = max_workers or getattr(settings, "ORDER_CANCELLATION_MAX_WORKERS", 16)
+        self.cancel_all = cancel_all if cancel_all is not None else \
+            getattr(settings, "ORDER_CANCELLATION_CANCEL_ALL", False)
+
+    def deactivate(self, bots) -> list:
+        """
+        Deactivate the bots and cancel all of their orders, returns a report per bot.
+        """
+        grid_bot_ids = list(bots.values_list("id", flat=True))
+        trading_bot_models.GridBot.objects.filter(id__in=grid_bot_ids).update(active=False, updated=timezone.now())
+        return self.cancel(trading_bot_models.Order.objects.filter(grid_bot_id__in=grid_bot_ids), grid_bot_ids)
+
+    def cancel(self, orders, grid_bot_ids=()) -> list:
+        """
+        Cancel the given orders, returns a ``CancellationReport`` for each of their bots and
+        for every bot of ``grid_bot_ids``.
+        """
+        started = time.perf_counter()
+        canceled = defaultdict(int)
+        finished_at = {grid_bot_id: started for grid_bot_id in grid_bot_ids}
+
+        # a submission holding the row lock commits before this update, its order is then
+        # no longer local and gets cancelled on the exchange below
+        local_orders = orders.filter(remote_id__isnull=True, state__in=[
+            trading_bot_models.Order.State.WaitingToSubmit.value, trading_bot_models.Order.State.Error.value
+        ])
+        local_bot_ids = list(local_orders.values_list("grid_bot_id", flat=True))
+        if local_bot_ids:
+            local_orders.update(state=trading_bot_models.Order.State.Canceled.value, updated=timezone.now())
+        for grid_bot_id in local_bot_ids:
+            canceled[grid_bot_id] += 1
+            finished_at[grid_bot_id] = time.perf_counter()
+
+        open_states = trading_bot_models.Order.State.active_states() + [trading_bot_models.Order.State.Idle.value]
+        remote_orders = list(orders.filter(remote_id__isnull=False, state__in=open_states)
+                             .select_related("exchange", "account", "market"))
+        changed_orders, unresolved_ids = [], []
+        for order, remote_state, finished in self._cancel_remote(remote_orders, open_states):
+            finished_at[order.grid_bot_id] = max(finished_at.get(order.grid_bot_id, started), finished)
+            if remote_state is None or remote_state.state in open_states:
+                unresolved_ids.append(order.id)
+            elif order.apply_remote_state(remote_state):
+                changed_orders.append(order)
+        if unresolved_ids:
+            reconciled_orders = trading_bot_models.Order.fetch_orders_state(
+                trading_bot_models.Order.objects.filter(id__in=unresolved_ids))
+            reconciled_at = time.perf_counter()
+            for order in reconciled_orders:
+                finished_at[order.grid_bot_id] = reconciled_at
+            changed_orders.extend(reconciled_orders)
+
+        with transaction.atomic():
+            saved_orders = trading_bot_models.Order.save_orders_state(changed_orders)
+            orders_by_bot = defaultdict(list)
+            for order in saved_orders:
+                orders_by_bot[order.grid_bot_id].append(order)
+            # fills found on the way, partial ones included, are booked; the bot is stopping so no
+            # counter orders are placed
+            for grid_bot in trading_bot_models.GridBot.objects.filter(id__in=orders_by_bot.keys()):
+                grid_bot.record_fills(orders_by_bot[grid_bot.id])
+        filled, partially_filled = defaultdict(int), defaultdict(int)
+        for order in changed_orders:
+            if order.state == trading_bot_models.Order.State.Canceled.value:
+                canceled[order.grid_bot_id] += 1
+            elif order.state == trading_bot_models.Order.State.Filled.value:
+                filled[order.grid_bot_id] += 1
+            elif order.state == trading_bot_models.Order.State.PartiallyFilledAndFinished.value:
+                partially_filled[order.grid_bot_id] += 1
+
+        # reconciled orders are fresh instances, their states override the ones loaded above
+        states = {order.id: order.state for order in remote_orders}
+        states.update((order.id, order.state) for order in changed_orders)
+        still_open = defaultdict(int)
+        for order in remote_orders:
+            still_open[order.grid_bot_id] += states[order.id] in open_states
+        reports = []
+        for grid_bot_id in sorted(finished_at):
+            seconds = finished_at[grid_bot_id] - started
+            metrics.observe("bot_cancellation_seconds", seconds, bot=grid_bot_id)
+            reports.append(CancellationReport(grid_bot_id, canceled[grid_bot_id], filled[grid_bot_id],
+                                              partially_filled[grid_bot_id], still_open[grid_bot_id], seconds))
+            logger.info("cancelled %s orders of bot %s in %.3fs, %s filled, %s partially filled, %s still open",
+                        canceled[grid_bot_id], grid_bot_id, seconds, filled[grid_bot_id],
+                        partially_filled[grid_bot_id], still_open[grid_bot_id])
+        return reports
+
+    def _cancel_remote(self, remote_orders: list, open_states: list) -> list:
+        """
+        Returns ``(order, RemoteOrderState or None when unknown, perf_counter when answered)``
+        for every order.
+        """
+        if not remote_orders:
+            return []
+        orders_by_account_market = defaultdict(list)
+        for order in remote_orders:
+            orders_by_account_market[(order.account_id, order.market_id)].append(order)
+        # a cancel-all request would also take the open orders of other bots on the account and market
+        open_counts = {
+            (row["account_id"], row["market_id"]): row["count"]
+            for row in trading_bot_models.Order.objects.filter(
+                remote_id__isnull=False, state__in=open_states,
+                account_id__in={account_id for account_id, _ in orders_by_account_market},
+                market_id__in={market_id for _, market_id in orders_by_account_market},
+            ).order_by().values("account_id", "market_id").annotate(count=Count("id"))
+        }
+
+        tasks = []
+        for key, account_orders in orders_by_account_market.items():
+            if self.cancel_all and account_orders[0].exchange.cancel_all_supported and \
+                    open_counts.get(key) == len(account_orders):
+                tasks.append((self._cancel_open_orders, account_orders))
+            else:
+                tasks.extend((self._cancel_order, [order]) for order in account_orders)
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(tasks))) as executor:
+            results = list(executor.map(lambda task: task[0](task[1]), tasks))
+        return [outcome for outcomes in results for outcome in outcomes]
+
+    @staticmethod
+    def _cancel_open_orders(orders: list) -> list:
+        first_order = orders[0]
+        try:
+            remote_states = first_order.exchange.cancel_open_orders(market=first_order.market,
+                                                                     account=first_order.account)
+        except Exception:
+            logger.exception("cancelling the open orders of account %s on market %s failed",
+                             first_order.account_id, first_order.market_id)
+            remote_states = {}
+        finally:
+            connections.close_all()
+        finished = time.perf_counter()
+        return [(order, remote_states.get(order.remote_id), finished) for order in orders]
+
+    @staticmethod
+    def _cancel_order(orders: list) -> list:
+        order, = orders
+        try:
+            remote_state = order.exchange.cancel_order(market=order.market, remote_id=order.remote_id,
+                                                       account=order.account)
+        except Exception as exception:
+            # orders that already filled or were cancelled are rejected too, reconciliation sorts them out
+            logger.info("cancelling order %s failed: %s", order.id, exception)
+            remote_state = None
+        finally:
+            connections.close_all()
+        return [(order, remote_state, time.perf_counter())]
@@ -0,0 +1,76 @@
+from decimal import Decimal
+from typing import NamedTuple, Optional
+
+from trading_bot import models as trading_bot_models
+from trading_bot.market_cache import market_cache
+from trading_bot.market_filters import OrderFilterError
+
+
+class OrderPayload(NamedTuple):
+    """
+    Arguments of a new limit order, with side and type in their exchange spelling.
+    """
+    symbol: str
+    side: str
+    type: str
+    quantity: str
+    price: str
+    client_order_id: Optional[str]
+
+
+class OrderPayloadBuilder:
+    """
+    Turns an order, or the same fields read with ``values()``, into exchange request
+    arguments. Prices and quantities are snapped to the market's filters with the rounding
+    that never makes an order more aggressive or larger than asked, an order the exchange
+    would reject raises ``OrderFilterError`` before any request is made.
+    """
+
+    values_fields = ("id", "market_id", "side", "price", "amount")
+
+    def __init__(self, markets=market_cache):
+        self.markets = markets
+
+    def build(self, order) -> OrderPayload:
+        return self.build_values(order.id, order.market_id, order.side, order.price, order.amount)
+
+    def build_row(self, row: dict) -> OrderPayload:
+        return self.build_values(row["id"], row["market_id"], row["side"], row["price"], row["amount"])
+
+    def build_many(self, orders) -> list:
+        """
+        Payloads of ``orders`` in order, ``None`` for those the filters reject.
+        """
+        return [self._build_or_none(self.build, order) for order in orders]
+
+    def build_rows(self, rows) -> list:
+        return [self._build_or_none(self.build_row, row) for row in rows]
+
+    @staticmethod
+    def _build_or_none(build, order) -> Optional[OrderPayload]:
+        try:
+            return build(order)
+        except OrderFilterError:
+            return None
+
+    def build_values(self, order_id, market_id, side, price, amount) -> OrderPayload:
+        market = self.markets.get(market_id)
+        market_filter = market.market_filter
+        sell = side == trading_bot_models.Order.Side.Sell.value
+        if not isinstance(price, Decimal):
+            price = Decimal(str(price))
+        if not isinstance(amount, Decimal):
+            amount = Decimal(str(amount))
+        price_units, quantity_units = market_filter.apply(price, amount, sell)
+        return OrderPayload(
+            market.symbol,
+            "SELL" if sell else "BUY",
+            "LIMIT",
+            market_filter.format_quantity(quantity_units),
+            market_filter.format_price(price_units),
+            # lets the exchange reject a resubmission of an order whose first outcome was lost
+            f"grid-{order_id}" if order_id else None,
+        )
+
+
+order_payloads = OrderPayloadBuilder()
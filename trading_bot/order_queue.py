@@ -0,0 +1,52 @@
+import logging
+import threading
+
+from django.db import transaction
+
+from trading_bot import models as trading_bot_models
+from trading_bot.order_retry import RetryScheduler
+from trading_bot.order_submission import OrderSubmitter
+
+logger = logging.getLogger(__name__)
+
+
+class OrderQueueWorker:
+    """
+    Treats the ``WaitingToSubmit`` orders as a work queue shared by any number of worker
+    processes. Each batch is claimed with ``SELECT ... FOR UPDATE SKIP LOCKED`` and stays
+    locked until its results are written in the same transaction, so concurrent workers
+    never pick the same order and a crashed worker releases its batch untouched. Orders of
+    stopped bots are left alone. Failed orders whose retry is due are resubmitted the same
+    way.
+    """
+
+    def __init__(self, batch_size: int = 20, poll_interval: float = 1, submitter: OrderSubmitter = None):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.submitter = submitter or OrderSubmitter()
+        self.retries = RetryScheduler(batch_size=batch_size, submitter=self.submitter)
+        self.stop_event = threading.Event()
+
+    def stop(self, *args):
+        self.stop_event.set()
+
+    def claim_and_submit(self) -> int:
+        with transaction.atomic():
+            orders = list(
+                trading_bot_models.Order.objects.select_for_update(skip_locked=True, of=("self",))
+                .filter(state=trading_bot_models.Order.State.WaitingToSubmit.value, grid_bot__active=True)
+                .select_related("exchange", "account")
+                .order_by("id")[:self.batch_size]
+            )
+            self.submitter.submit_orders(orders)
+        return len(orders)
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                submitted = self.claim_and_submit() + self.retries.run_due()
+            except Exception:
+                logger.exception("submitting a batch failed")
+                submitted = 0
+            if submitted < self.batch_size:
+                self.stop_event.wait(self.poll_interval)
@@ -0,0 +1,38 @@
+from django.db import transaction
+from django.utils import timezone
+
+from trading_bot import models as trading_bot_models
+from trading_bot.order_submission import OrderSubmitter
+
+
+class RetryScheduler:
+    """
+    Resubmits failed orders whose retry is due. Due retries are claimed with
+    ``SELECT ... FOR UPDATE SKIP LOCKED`` so several processes can share them, an order
+    that succeeds loses its retry record and one that fails again is rescheduled by
+    ``OrderRetry.schedule_failed``.
+    """
+
+    def __init__(self, batch_size: int = 100, submitter: OrderSubmitter = None):
+        self.batch_size = batch_size
+        self.submitter = submitter or OrderSubmitter()
+
+    def run_due(self, orders=None, now=None) -> int:
+        retries = trading_bot_models.OrderRetry.objects.select_for_update(skip_locked=True, of=("self",)).filter(
+            next_attempt_at__lte=now or timezone.now(),
+            order__state=trading_bot_models.Order.State.Error.value,
+            order__grid_bot__active=True,
+        )
+        if orders is not None:
+            retries = retries.filter(order__in=orders)
+        with transaction.atomic():
+            retries = list(retries.select_related("order__exchange", "order__account", "order__market")
+                           .order_by("next_attempt_at")[:self.batch_size])
+            if not retries:
+                return 0
+            retried_orders = [retry.order for retry in retries]
+            self.submitter.submit_orders(retried_orders)
+            trading_bot_models.OrderRetry.objects.filter(
+                order__in=[order for order in retried_orders if order.submit_error is None]
+            ).delete()
+        return len(retries)
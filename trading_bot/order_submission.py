@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from trading_bot import models as trading_bot_models
+from trading_bot.order_cancellation import OrderCanceller
+from trading_bot.order_payload import order_payloads
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: ``rate`` tokens are added per second up to ``capacity``.
+    ``acquire`` blocks until a token is available.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+                self._last_refill = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class OrderSubmitter:
+    """
+    Submits ``WaitingToSubmit`` orders concurrently through a thread pool, rate limited per
+    account, and persists the results with one ``bulk_update`` per outcome. One instance can
+    be shared by threads, the rate limits then hold across all of them.
+    """
+
+    def __init__(self, max_workers: int = None, rate: float = None, burst: int = None):
+        self.max_workers = max_workers or getattr(settings, "ORDER_SUBMISSION_MAX_WORKERS", 8)
+        self.rate = rate or getattr(settings, "ORDER_SUBMISSION_RATE_PER_ACCOUNT", 5)
+        self.burst = burst or getattr(settings, "ORDER_SUBMISSION_BURST_PER_ACCOUNT", 10)
+        self._buckets = defaultdict(lambda: TokenBucket(rate=self.rate, capacity=self.burst))
+        self._buckets_lock = threading.Lock()
+
+    def submit(self, orders) -> list:
+        orders = list(orders.filter(
+            state=trading_bot_models.Order.State.WaitingToSubmit.value
+        ).select_related("exchange", "account"))
+        return self.submit_orders(orders)
+
+    def submit_orders(self, orders: list) -> list:
+        if not orders:
+            return orders
+
+        # create the buckets up front, defaultdict is not safe to populate from the workers
+        with self._buckets_lock:
+            for order in orders:
+                _ = self._buckets[order.account_id]
+        payloads = order_payloads.build_many(orders)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            update_fields = list(executor.map(self._send, orders, payloads))
+
+        self._persist(orders, update_fields)
+        return orders
+
+    def _send(self, order, payload) -> list:
+        try:
+            self._buckets[order.account_id].acquire()
+            return order.send_to_exchange(payload)
+        finally:
+            connections.close_all()
+
+    @staticmethod
+    def _persist(orders, update_fields):
+        now = timezone.now()
+        orders_by_fields = defaultdict(list)
+        for order, fields in zip(orders, update_fields):
+            order.updated = now
+            orders_by_fields[tuple(fields)].append(order)
+        # an order cancelled while it was being sent keeps its Canceled state
+        pending_orders = trading_bot_models.Order.objects.filter(remote_id__isnull=True, state__in=[
+            trading_bot_models.Order.State.WaitingToSubmit.value, trading_bot_models.Order.State.Error.value
+        ])
+        lost = 0
+        for fields, fields_orders in orders_by_fields.items():
+            lost += len(fields_orders) - pending_orders.bulk_update(fields_orders, fields=list(fields))
+        if lost:
+            orders = OrderSubmitter._cancel_lost_orders(orders)
+        trading_bot_models.GridBot.touch({order.grid_bot_id for order in orders})
+        trading_bot_models.OrderRetry.schedule_failed(orders)
+
+    @staticmethod
+    def _cancel_lost_orders(orders: list) -> list:
+        """
+        Cancels on the exchange the orders that reached it after they were cancelled in the
+        database, returns the other orders.
+        """
+        lost_ids = set(trading_bot_models.Order.objects.filter(
+            id__in=[order.id for order in orders], remote_id__isnull=True,
+            state=trading_bot_models.Order.State.Canceled.value
+        ).values_list("id", flat=True))
+        placed_orders = [order for order in orders if order.id in lost_ids and order.remote_id is not None]
+        for order in placed_orders:
+            trading_bot_models.Order.objects.filter(id=order.id, remote_id__isnull=True).update(
+                remote_id=order.remote_id, state=trading_bot_models.Order.State.Waiting.value, updated=order.updated)
+        if placed_orders:
+            # the canceller reconciles whatever the cancel leaves unknown
+            OrderCanceller().cancel(
+                trading_bot_models.Order.objects.filter(id__in=[order.id for order in placed_orders]))
+        return [order for order in orders if order.id not in lost_ids]
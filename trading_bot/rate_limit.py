@@ -0,0 +1,193 @@
+import functools
+import hashlib
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+
+from trading_bot.metrics import metrics
+
+try:
+    import fcntl
+except ImportError:  # windows, buckets are then only safe within one process
+    fcntl = None
+
+# tokens, last refill and banned until, as unix timestamps
+BUCKET_STATE = struct.Struct("<3d")
+
+HIGH_PRIORITY, LOW_PRIORITY = "high", "low"
+
+# cancels and status checks keep the bot's view of its orders correct, new orders and market
+# syncs can wait for them
+REQUEST_PRIORITIES = {
+    "cancel_order": HIGH_PRIORITY,
+    "cancel_open_orders": HIGH_PRIORITY,
+    "get_order": HIGH_PRIORITY,
+    "get_orders": HIGH_PRIORITY,
+    "get_open_orders": HIGH_PRIORITY,
+    "new_listen_key": HIGH_PRIORITY,
+    "renew_listen_key": HIGH_PRIORITY,
+}
+
+# request weights, the heavier history and market endpoints cost more than single order calls
+REQUEST_WEIGHTS = {
+    "get_orders": 5,
+    "get_open_orders": 3,
+    "exchange_info": 10,
+}
+
+# seconds every process stays away after a rate limit response, 418 is an ip ban
+BACKOFF_STATUSES = {429: 5, 418: 60}
+
+metrics.describe("exchange_rate_limit_wait_seconds", "Time exchange requests waited for the rate limiter")
+
+
+class SharedTokenBucket:
+    """
+    Token bucket whose state lives in a small file under an exclusive ``flock``, so every
+    process on the host draws from the same budget. Low priority requests leave
+    ``reserve`` of the capacity to high priority ones.
+    """
+
+    def __init__(self, path: Path, rate: float, capacity: float, reserve: float):
+        self.path = path
+        self.rate = rate
+        self.capacity = capacity
+        self.reserve = reserve
+        # flock does not exclude threads sharing a descriptor, they take the thread lock first
+        self._lock = threading.Lock()
+        self._fd = None
+        self._pid = None
+
+    def open(self, stack: ExitStack) -> int:
+        self._lock.acquire()
+        stack.callback(self._lock.release)
+        if self._pid != os.getpid():
+            # a forked child must not share the parent's descriptor, and with it the parent's lock
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            self._pid = os.getpid()
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            stack.callback(fcntl.flock, self._fd, fcntl.LOCK_UN)
+        return self._fd
+
+    def read(self, fd: int, now: float) -> list:
+        data = os.pread(fd, BUCKET_STATE.size, 0)
+        tokens, last_refill, banned_until = BUCKET_STATE.unpack(data) if len(data) == BUCKET_STATE.size \
+            else (self.capacity, now, 0)
+        tokens = min(self.capacity, tokens + max(0, now - last_refill) * self.rate)
+        return [tokens, now, banned_until]
+
+    @staticmethod
+    def write(fd: int, state: list):
+        os.pwrite(fd, BUCKET_STATE.pack(*state), 0)
+
+    def wait_time(self, state: list, weight: float, priority: str, now: float) -> float:
+        if state[2] > now:
+            return state[2] - now
+        floor = self.capacity * self.reserve if priority == LOW_PRIORITY else 0
+        weight = min(weight, self.capacity - floor)
+        missing = floor + weight - state[0]
+        return max(0, missing / self.rate)
+
+
+class RateLimitGateway:
+    """
+    Budgets of exchange requests per account and per IP, shared across the processes of
+    this host. ``acquire`` blocks until every bucket of the request can pay its weight,
+    requests are queued rather than rejected. Buckets are shared per file, so a process
+    holds one descriptor per budget however many clients it builds and drops.
+    """
+
+    def __init__(self, directory: Path = None, limits: dict = None, reserve: float = None, max_sleep: float = 1):
+        self.directory = Path(directory or getattr(settings, "EXCHANGE_RATE_LIMIT_DIR", None)
+                              or Path(tempfile.gettempdir()) / "grid_bot_rate_limits")
+        self.limits = limits or {
+            "account": getattr(settings, "TABDEAL_RATE_LIMIT_PER_ACCOUNT", (10, 20)),
+            "ip": getattr(settings, "TABDEAL_RATE_LIMIT_PER_IP", (20, 60)),
+        }
+        self.reserve = reserve if reserve is not None else getattr(settings, "EXCHANGE_RATE_LIMIT_RESERVE", 0.25)
+        self.max_sleep = max_sleep
+        self._buckets = {}
+        self._buckets_lock = threading.Lock()
+
+    def buckets(self, provider: str, api_key) -> list:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        account_digest = hashlib.sha256((api_key or "").encode()).hexdigest()[:16]
+        # one fixed order for every caller, the files are always locked ip first
+        return [
+            self.bucket(self.directory / f"{provider}-ip", self.limits["ip"]),
+            self.bucket(self.directory / f"{provider}-account-{account_digest}", self.limits["account"]),
+        ]
+
+    def bucket(self, path: Path, limit: tuple) -> SharedTokenBucket:
+        with self._buckets_lock:
+            bucket = self._buckets.get(path)
+            if bucket is None:
+                bucket = self._buckets[path] = SharedTokenBucket(path, *limit, reserve=self.reserve)
+            return bucket
+
+    def acquire(self, buckets: list, weight: float = 1, priority: str = LOW_PRIORITY) -> float:
+        started = time.time()
+        while True:
+            with ExitStack() as stack:
+                descriptors = [bucket.open(stack) for bucket in buckets]
+                now = time.time()
+                states = [bucket.read(fd, now) for bucket, fd in zip(buckets, descriptors)]
+                wait = max(bucket.wait_time(state, weight, priority, now) for bucket, state in zip(buckets, states))
+                if wait == 0:
+                    for bucket, fd, state in zip(buckets, descriptors, states):
+                        state[0] -= weight
+                        bucket.write(fd, state)
+                    waited = now - started
+                    metrics.observe("exchange_rate_limit_wait_seconds", waited, priority=priority)
+                    return waited
+            time.sleep(min(wait, self.max_sleep))
+
+    def back_off(self, buckets: list, seconds: float):
+        with ExitStack() as stack:
+            now = time.time()
+            for bucket in buckets:
+                fd = bucket.open(stack)
+                state = bucket.read(fd, now)
+                state[0] = min(state[0], 0)
+                state[2] = max(state[2], now + seconds)
+                bucket.write(fd, state)
+
+
+class RateLimitedClient:
+    """
+    Wraps an exchange client so each of its API calls first waits for the gateway, and a
+    rate limit response pauses the account and IP for every process.
+    """
+
+    def __init__(self, client, gateway: RateLimitGateway, provider: str, api_key):
+        self.client = client
+        self.gateway = gateway
+        self.buckets = gateway.buckets(provider, api_key)
+
+    def __getattr__(self, name):
+        attribute = getattr(self.client, name)
+        if not callable(attribute) or name.startswith("_"):
+            return attribute
+
+        @functools.wraps(attribute)
+        def call(*args, **kwargs):
+            self.gateway.acquire(self.buckets, weight=REQUEST_WEIGHTS.get(name, 1),
+                                 priority=REQUEST_PRIORITIES.get(name, LOW_PRIORITY))
+            try:
+                return attribute(*args, **kwargs)
+            except Exception as exception:
+                backoff = BACKOFF_STATUSES.get(getattr(exception, "status", None))
+                if backoff:
+                    self.gateway.back_off(self.buckets, backoff)
+                raise
+        return call
+
+
+rate_limit_gateway = RateLimitGateway()
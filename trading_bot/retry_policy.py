@@ -0,0 +1,72 @@
+import random
+from datetime import timedelta
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+
+from trading_bot.market_filters import OrderFilterError
+
+# request timeout, too many requests and Binance style IP bans are worth waiting out
+RETRYABLE_CLIENT_STATUSES = {408, 418, 425, 429}
+
+
+class ExchangeError(NamedTuple):
+    code: str
+    status: Optional[int]
+    retryable: bool
+    message: str
+
+
+def classify_error(exception: Exception) -> ExchangeError:
+    """
+    Maps an exception raised while talking to an exchange to a short error code and
+    whether trying again later can succeed. Anything unrecognised is treated as fatal.
+    """
+    # imported here so processes that never reach an exchange skip the SDK imports
+    import requests
+    from tabdeal import exceptions as tabdeal_exceptions
+
+    message = str(exception)[:255]
+    status = getattr(exception, "status", None)
+    if isinstance(exception, OrderFilterError):
+        return ExchangeError(exception.code, None, False, message)
+    if isinstance(exception, tabdeal_exceptions.ServerException):
+        return ExchangeError(f"server_{status}", status, True, message)
+    if isinstance(exception, tabdeal_exceptions.ClientException):
+        code = f"client_{exception.code}" if exception.code is not None else f"client_{status}"
+        return ExchangeError(code, status, status in RETRYABLE_CLIENT_STATUSES, message)
+    if isinstance(exception, tabdeal_exceptions.UnStructuredResponseException):
+        return ExchangeError(f"unstructured_{status}", status,
+                             status is not None and (status >= 500 or status in RETRYABLE_CLIENT_STATUSES), message)
+    if isinstance(exception, requests.Timeout):
+        return ExchangeError("timeout", None, True, message)
+    if isinstance(exception, requests.ConnectionError):
+        return ExchangeError("connection", None, True, message)
+    if isinstance(exception, tabdeal_exceptions.ParameterRequiredException):
+        return ExchangeError("missing_parameter", None, False, message)
+    if isinstance(exception, tabdeal_exceptions.SecurityException):
+        return ExchangeError("credentials", None, False, message)
+    return ExchangeError(type(exception).__name__[:32], status, False, message)
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with equal jitter: attempt ``n`` waits between half and all of
+    ``base_delay * 2 ** (n - 1)`` seconds, capped at ``max_delay``, so workers that failed
+    together during an outage do not come back together.
+    """
+
+    def __init__(self, base_delay: float = None, max_delay: float = None, max_attempts: int = None):
+        self.base_delay = base_delay or getattr(settings, "ORDER_RETRY_BASE_DELAY", 2)
+        self.max_delay = max_delay or getattr(settings, "ORDER_RETRY_MAX_DELAY", 300)
+        self.max_attempts = max_attempts or getattr(settings, "ORDER_RETRY_MAX_ATTEMPTS", 8)
+
+    def delay(self, attempts: int) -> timedelta:
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return timedelta(seconds=random.uniform(delay / 2, delay))
+
+    def should_retry(self, error: ExchangeError, attempts: int) -> bool:
+        return error.retryable and attempts < self.max_attempts
+
+
+retry_policy = RetryPolicy()
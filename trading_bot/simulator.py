@@ -0,0 +1,216 @@
+import heapq
+import itertools
+import threading
+import time
+from decimal import Decimal
+from typing import Iterable, Optional
+
+from tabdeal.exceptions import ClientException
+
+
+class SimulatedOrderBook:
+    """
+    Resting limit orders of one market. Bids and asks are heaps ordered by price then
+    arrival, cancelled orders are dropped lazily when they reach the top.
+    """
+
+    def __init__(self, symbol: str, last_price: Optional[Decimal] = None):
+        self.symbol = symbol
+        self.last_price = last_price
+        self.bids = []
+        self.asks = []
+        self.orders = {}
+
+    def add(self, order: dict, sequence: int):
+        self.orders[order["orderId"]] = order
+        price = order["_price"]
+        if order["side"] == "BUY":
+            if self.last_price is not None and price >= self.last_price:
+                self._fill(order, order["_quantity"])
+            else:
+                heapq.heappush(self.bids, (-price, sequence, order))
+        else:
+            if self.last_price is not None and price <= self.last_price:
+                self._fill(order, order["_quantity"])
+            else:
+                heapq.heappush(self.asks, (price, sequence, order))
+
+    def move_price(self, price: Decimal, volume: Optional[Decimal] = None):
+        """
+        Trade at ``price``, filling resting orders at or beyond it in price-time priority.
+        ``volume`` caps the quantity filled, the order it runs out on becomes partially
+        filled.
+        """
+        self.last_price = price
+        remaining = volume
+        for book, crossed in ((self.bids, lambda key: -key >= price), (self.asks, lambda key: key <= price)):
+            while book and crossed(book[0][0]) and (remaining is None or remaining > 0):
+                order = book[0][2]
+                if order["status"] not in ("NEW", "PARTIALLY_FILLED"):
+                    heapq.heappop(book)
+                    continue
+                open_quantity = order["_quantity"] - order["_executed"]
+                quantity = open_quantity if remaining is None else min(open_quantity, remaining)
+                self._fill(order, quantity)
+                if remaining is not None:
+                    remaining -= quantity
+                if order["status"] == "FILLED":
+                    heapq.heappop(book)
+
+    @staticmethod
+    def _fill(order: dict, quantity: Decimal):
+        order["_executed"] += quantity
+        order["executedQty"] = str(order["_executed"])
+        order["status"] = "FILLED" if order["_executed"] >= order["_quantity"] else "PARTIALLY_FILLED"
+
+
+class SimulatedExchange:
+    """
+    In-process exchange answering the subset of the ``tabdeal.spot.Spot`` API the bots use,
+    with the same order payloads and status strings. Prices move only when told to, through
+    ``move_price`` or ``replay``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._order_ids = itertools.count(1)
+        self._sequence = itertools.count()
+        self.books = {}
+        self.markets = {}
+        self.orders = {}
+        self.client_order_ids = {}
+
+    def reset(self):
+        with self._lock:
+            self.books.clear()
+            self.markets.clear()
+            self.orders.clear()
+            self.client_order_ids.clear()
+
+    def add_market(self, base_asset: str, quote_asset: str, tick_size: str = "0.01", step_size: str = "0.000001",
+                   last_price: Decimal = None):
+        symbol = f"{base_asset}{quote_asset}"
+        with self._lock:
+            self.markets[symbol] = {
+                "symbol": symbol,
+                "baseAsset": base_asset,
+                "quoteAsset": quote_asset,
+                "filters": [
+                    {"filterType": "PRICE_FILTER", "tickSize": tick_size},
+                    {"filterType": "LOT_SIZE", "stepSize": step_size},
+                ],
+            }
+            self.books[symbol] = SimulatedOrderBook(symbol, last_price=last_price)
+
+    def move_price(self, symbol: str, price, volume=None):
+        with self._lock:
+            self._book(symbol).move_price(Decimal(str(price)), None if volume is None else Decimal(str(volume)))
+
+    def replay(self, symbol: str, candles: Iterable):
+        """
+        Walks the price through every candle, open, low, high, close on up candles and open,
+        high, low, close on down candles.
+        """
+        for candle in candles:
+            path = (candle.open, candle.low, candle.high, candle.close) if candle.close >= candle.open else \
+                (candle.open, candle.high, candle.low, candle.close)
+            for price in path:
+                self.move_price(symbol, price)
+
+    # Spot API
+
+    def exchange_info(self, **kwargs):
+        return list(self.markets.values())
+
+    def new_order(self, symbol: str, side, type, quantity, price=None, client_order_id: str = None, **kwargs):
+        symbol = self._symbol(symbol)
+        price = Decimal(str(price))
+        quantity = Decimal(str(quantity))
+        with self._lock:
+            if client_order_id and client_order_id in self.client_order_ids:
+                return self._public(self.orders[self.client_order_ids[client_order_id]])
+            order_id = next(self._order_ids)
+            if client_order_id:
+                self.client_order_ids[client_order_id] = order_id
+            order = {
+                "orderId": order_id,
+                "clientOrderId": client_order_id,
+                "symbol": symbol,
+                "side": getattr(side, "value", side),
+                "type": getattr(type, "value", type),
+                "price": str(price),
+                "origQty": str(quantity),
+                "executedQty": "0",
+                "status": "NEW",
+                "time": int(time.time() * 1000),
+                "_price": price,
+                "_quantity": quantity,
+                "_executed": Decimal(0),
+            }
+            self.orders[order_id] = order
+            self._book(symbol).add(order, next(self._sequence))
+        return self._public(order)
+
+    def get_order(self, symbol: str, order_id: int = None, client_order_id: str = None):
+        if order_id is None:
+            order_id = self.client_order_ids.get(client_order_id)
+            if order_id is None:
+                raise ClientException(400, "Order does not exist.", -2013)
+        return self._public(self.orders[order_id])
+
+    def get_orders(self, symbol: str, start_time: int = None, end_time: int = None, limit: int = None):
+        book = self._book(self._symbol(symbol))
+        orders = [self._public(order) for order in book.orders.values()
+                  if (start_time is None or order["time"] >= start_time)
+                  and (end_time is None or order["time"] <= end_time)]
+        # oldest first from start_time, like the exchange
+        return orders[:limit] if limit else orders
+
+    def get_open_orders(self, symbol: str = None):
+        books = [self._book(self._symbol(symbol))] if symbol else list(self.books.values())
+        return [self._public(order) for book in books for order in book.orders.values()
+                if order["status"] in ("NEW", "PARTIALLY_FILLED")]
+
+    def cancel_order(self, symbol: str, order_id: int = None, **kwargs):
+        with self._lock:
+            order = self.orders[order_id]
+            if order["status"] in ("NEW", "PARTIALLY_FILLED"):
+                self._cancel(order)
+        return self._public(order)
+
+    def cancel_open_orders(self, symbol: str):
+        book = self._book(self._symbol(symbol))
+        with self._lock:
+            canceled = []
+            for order in book.orders.values():
+                if order["status"] in ("NEW", "PARTIALLY_FILLED"):
+                    self._cancel(order)
+                    canceled.append(self._public(order))
+        return canceled
+
+    def trades(self, symbol: str, limit: int = None):
+        last_price = self._book(self._symbol(symbol)).last_price
+        return [{"price": str(last_price)}] if last_price is not None else []
+
+    def _book(self, symbol: str) -> SimulatedOrderBook:
+        book = self.books.get(symbol)
+        if book is None:
+            raise KeyError(f"unknown market {symbol}")
+        return book
+
+    @staticmethod
+    def _cancel(order: dict):
+        # like Tabdeal, an order cancelled after a partial fill finishes as partially filled
+        order["status"] = "PARTIALLY_FILLED_AND_FINISHED" if order["_executed"] else "CANCELED"
+
+    @staticmethod
+    def _symbol(symbol: str) -> str:
+        # status queries use the BASE_QUOTE form, orders the BASEQUOTE one
+        return symbol.replace("_", "")
+
+    @staticmethod
+    def _public(order: dict) -> dict:
+        return {key: value for key, value in order.items() if not key.startswith("_")}
+
+
+simulated_exchange = SimulatedExchange()
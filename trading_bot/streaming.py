@@ -0,0 +1,177 @@
+import json
+import logging
+import threading
+import time
+from decimal import Decimal
+
+logger = logging.getLogger(__name__)
+
+
+class StreamView:
+    """
+    In-memory last price per symbol and last known ``RemoteOrderState`` per remote order
+    id, fed by stream events.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.last_prices = {}
+        self.order_states = {}
+
+    def set_price(self, symbol: str, price: Decimal):
+        with self._lock:
+            self.last_prices[symbol] = price
+
+    def set_order_state(self, remote_id: int, state):
+        with self._lock:
+            self.order_states[remote_id] = state
+
+    def seed_order_states(self, order_states: dict):
+        # polled states must not overwrite fresher events received meanwhile
+        with self._lock:
+            for remote_id, state in order_states.items():
+                self.order_states.setdefault(remote_id, state)
+
+    def forget_order_states(self, remote_ids):
+        with self._lock:
+            for remote_id in remote_ids:
+                self.order_states.pop(remote_id, None)
+
+    def clear_order_states(self):
+        with self._lock:
+            self.order_states.clear()
+
+    def last_price(self, symbol: str):
+        return self.last_prices.get(symbol)
+
+    def order_state(self, remote_id: int):
+        return self.order_states.get(remote_id)
+
+
+class ExchangeStream(threading.Thread):
+    """
+    Keeps a websocket connection open, reconnecting with exponential backoff, and applies
+    the events the exchange interface parses out of it to a ``StreamView``.
+
+    ``connected_since`` is the time the current connection was opened: an order submitted
+    after it without any event is known to be unchanged, anything older needs a poll.
+    """
+
+    def __init__(self, url: str, exchange_interface, subscribe_payload: dict = None, keepalive=None,
+                 keepalive_interval: float = 1800, reconnect_delay: float = 1, max_reconnect_delay: float = 60):
+        super().__init__(daemon=True)
+        self.url = url
+        self.exchange_interface = exchange_interface
+        self.subscribe_payload = subscribe_payload
+        self.keepalive = keepalive
+        self.keepalive_interval = keepalive_interval
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.view = StreamView()
+        self.connected_since = None
+        self._stop_event = threading.Event()
+        self._ws = None
+
+    @property
+    def connected(self) -> bool:
+        return self.connected_since is not None
+
+    def run(self):
+        # imported here so processes that never open a stream skip the websocket client
+        import websocket
+
+        if self.keepalive is not None:
+            threading.Thread(target=self._keep_alive, daemon=True).start()
+        delay = self.reconnect_delay
+        while not self._stop_event.is_set():
+            self._ws = websocket.WebSocketApp(self.url, on_open=self._on_open, on_message=self._on_message,
+                                              on_close=self._on_close, on_error=self._on_error)
+            self._ws.run_forever(ping_interval=30, ping_timeout=5)
+            was_connected = self.connected
+            self.connected_since = None
+            if was_connected:
+                delay = self.reconnect_delay
+            self._stop_event.wait(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def stop(self, timeout: float = None):
+        self._stop_event.set()
+        if self._ws is not None:
+            self._ws.close()
+        self.join(timeout=timeout)
+
+    def _keep_alive(self):
+        while not self._stop_event.wait(self.keepalive_interval):
+            try:
+                self.keepalive()
+            except Exception:
+                logger.exception("stream %s keepalive failed", self.url)
+
+    def _on_open(self, ws):
+        # events may have been missed while disconnected, orders are polled again until seen
+        self.view.clear_order_states()
+        if self.subscribe_payload:
+            ws.send(json.dumps(self.subscribe_payload))
+        self.connected_since = time.time()
+        logger.info("stream %s connected", self.url)
+
+    def _on_message(self, ws, message):
+        try:
+            event = json.loads(message)
+        except ValueError:
+            return
+        # combined streams wrap the payload as {"stream": ..., "data": ...}
+        if isinstance(event, dict) and "data" in event and "stream" in event:
+            event = event["data"]
+        self.exchange_interface.apply_stream_event(event, self.view)
+
+    def _on_close(self, ws, *args):
+        self.connected_since = None
+        logger.info("stream %s disconnected", self.url)
+
+    def _on_error(self, ws, error):
+        logger.warning("stream %s error: %s", self.url, error)
+
+
+class StreamRegistry:
+    """
+    The running streams per account. ``get`` only returns a stream while it is connected,
+    callers fall back to polling otherwise.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._streams = {}
+
+    def start(self, account_id: int, stream: ExchangeStream) -> ExchangeStream:
+        with self._lock:
+            if account_id in self._streams:
+                return self._streams[account_id]
+            self._streams[account_id] = stream
+        stream.start()
+        return stream
+
+    def running(self, account_id: int) -> bool:
+        return account_id in self._streams
+
+    def get(self, account_id: int):
+        stream = self._streams.get(account_id)
+        if stream is not None and stream.connected:
+            return stream
+        return None
+
+    def forget_order_states(self, remote_ids_by_account: dict):
+        for account_id, remote_ids in remote_ids_by_account.items():
+            stream = self._streams.get(account_id)
+            if stream is not None:
+                stream.view.forget_order_states(remote_ids)
+
+    def stop_all(self, timeout: float = None):
+        with self._lock:
+            streams = list(self._streams.values())
+            self._streams.clear()
+        for stream in streams:
+            stream.stop(timeout=timeout)
+
+
+order_streams = StreamRegistry()
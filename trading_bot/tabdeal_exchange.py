@@ -0,0 +1,256 @@
+import hashlib
+import json
+import logging
+from decimal import Decimal
+from typing import Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from tabdeal.enums import OrderSides, OrderTypes
+from tabdeal.exceptions import ClientException
+from tabdeal.spot import Spot
+
+from trading_bot.client_pool import client_pool
+from trading_bot.market_cache import market_cache
+from trading_bot.models import BaseExchangeInterFace, Currency, Market, Order, RemoteOrderState
+from trading_bot.order_payload import OrderPayload
+from trading_bot.rate_limit import RateLimitedClient, rate_limit_gateway
+from trading_bot.retry_policy import classify_error
+from trading_bot.simulator import simulated_exchange
+from trading_bot.streaming import ExchangeStream, StreamView
+
+logger = logging.getLogger(__name__)
+
+
+class Tabdeal(BaseExchangeInterFace):
+    cancel_all_supported = True
+
+    @staticmethod
+    def order_state(remote_state: str) -> int:
+        if remote_state == "NEW":
+            return Order.State.Waiting.value
+        elif remote_state in ["FILED", "FILLED"]:
+            return Order.State.Filled.value
+        elif remote_state == "PARTIALLY_FILLED":
+            return Order.State.PartiallyFilled.value
+        elif remote_state == "PARTIALLY_FILLED_AND_FINISHED":
+            return Order.State.PartiallyFilledAndFinished.value
+        elif remote_state == "ERROR":
+            return Order.State.Error.value
+        elif remote_state == "CANCELED":
+            return Order.State.Canceled.value
+        return Order.State.Idle.value
+
+    @classmethod
+    def remote_order_state(cls, remote_order: dict) -> RemoteOrderState:
+        executed = remote_order.get('executedQty')
+        return RemoteOrderState(cls.order_state(remote_order['status']),
+                                Decimal(str(executed)) if executed is not None else None)
+
+    def get_client(self):
+        return client_pool.get_client(
+            key=client_pool.make_key("tabdeal", self.api_key, self.api_secret),
+            factory=lambda: RateLimitedClient(Spot(self.api_key, self.api_secret), rate_limit_gateway, "tabdeal",
+                                              self.api_key)
+        )
+
+    @staticmethod
+    def market_filter(market: dict, filter_type: str) -> dict:
+        for market_filter in market.get('filters', []):
+            if market_filter.get('filterType') == filter_type:
+                return market_filter
+        return {}
+
+    @staticmethod
+    def step_precision(step) -> int:
+        return max(0, -Decimal(str(step)).normalize().as_tuple().exponent)
+
+    def get_and_update_markets(self, exchange_db_instance):
+        client = self.get_client()
+        markets = client.exchange_info()
+        markets_hash = hashlib.sha256(json.dumps(markets, sort_keys=True, default=str).encode()).hexdigest()
+        if markets_hash == exchange_db_instance.markets_hash:
+            return
+
+        precisions = {}
+        sizes = {}
+        for market in markets:
+            tick_size = self.market_filter(market, 'PRICE_FILTER').get('tickSize')
+            step_size = self.market_filter(market, 'LOT_SIZE').get('stepSize')
+            min_notional = (self.market_filter(market, 'MIN_NOTIONAL') or self.market_filter(market, 'NOTIONAL')).get(
+                'minNotional')
+            sizes[(market['baseAsset'], market['quoteAsset'])] = tuple(
+                Decimal(str(size)) if size else None for size in (tick_size, step_size, min_notional))
+            if step_size:
+                precisions[market['baseAsset']] = self.step_precision(step_size)
+
+        with transaction.atomic():
+            currencies = {}
+            for currency in Currency.objects.all():
+                currencies.setdefault(currency.symbol, currency)
+            symbols = {market['baseAsset'] for market in markets} | {market['quoteAsset'] for market in markets}
+            missing_symbols = symbols - currencies.keys()
+            if missing_symbols:
+                new_currencies = [Currency(symbol=symbol) for symbol in missing_symbols]
+                # new rows get their final values up front, bulk_update is kept for real changes
+                for currency in new_currencies:
+                    currency.precision = precisions.get(currency.symbol, currency.precision)
+                Currency.objects.bulk_create(new_currencies)
+                for currency in Currency.objects.filter(symbol__in=missing_symbols):
+                    currencies.setdefault(currency.symbol, currency)
+
+            changed_currencies = [currency for symbol, currency in currencies.items()
+                                  if symbol in precisions and currency.precision != precisions[symbol]]
+            # bulk_update skips auto_now, processes caching markets compare the updated times
+            now = timezone.now()
+            for currency in changed_currencies:
+                currency.precision = precisions[currency.symbol]
+                currency.updated = now
+            if changed_currencies:
+                Currency.objects.bulk_update(changed_currencies, fields=["precision", "updated"])
+
+            db_markets = {}
+            for db_market in Market.objects.all():
+                db_markets.setdefault((db_market.first_currency_id, db_market.second_currency_id), db_market)
+            sizes = {(currencies[base].id, currencies[quote].id): market_sizes
+                     for (base, quote), market_sizes in sizes.items()}
+            market_keys = set(sizes.keys())
+            missing_market_keys = market_keys - db_markets.keys()
+            if missing_market_keys:
+                Market.objects.bulk_create([Market(first_currency_id=first_currency_id,
+                                                   second_currency_id=second_currency_id,
+                                                   tick_size=sizes[(first_currency_id, second_currency_id)][0],
+                                                   step_size=sizes[(first_currency_id, second_currency_id)][1],
+                                                   min_notional=sizes[(first_currency_id, second_currency_id)][2])
+                                            for first_currency_id, second_currency_id in missing_market_keys])
+                for db_market in Market.objects.filter(
+                        first_currency_id__in={key[0] for key in missing_market_keys},
+                        second_currency_id__in={key[1] for key in missing_market_keys}):
+                    db_markets.setdefault((db_market.first_currency_id, db_market.second_currency_id), db_market)
+
+            changed_markets = []
+            for market_key in market_keys:
+                db_market = db_markets[market_key]
+                tick_size, step_size, min_notional = sizes[market_key]
+                if db_market.tick_size != tick_size or db_market.step_size != step_size or \
+                        db_market.min_notional != min_notional:
+                    db_market.tick_size = tick_size
+                    db_market.step_size = step_size
+                    db_market.min_notional = min_notional
+                    db_market.updated = now
+                    changed_markets.append(db_market)
+            if changed_markets:
+                Market.objects.bulk_update(changed_markets,
+                                           fields=["tick_size", "step_size", "min_notional", "updated"])
+
+            # set() also detaches the markets the exchange no longer lists
+            exchange_db_instance.markets.set([db_markets[key].id for key in market_keys])
+            exchange_db_instance.markets_hash = markets_hash
+            exchange_db_instance.save(update_fields=["markets_hash", "updated"])
+        # bulk queries do not send the signals the cache listens to
+        market_cache.clear()
+
+    def submit_order(self, payload: OrderPayload) -> int:
+        client = self.get_client()
+        order = client.new_order(
+            symbol=payload.symbol,
+            side=OrderSides(payload.side),
+            type=OrderTypes(payload.type),
+            quantity=payload.quantity,
+            price=payload.price,
+            client_order_id=payload.client_order_id
+        )
+        return int(order['orderId'])
+
+    def update_order_state(self, order_id: int) -> None:
+        client = self.get_client()
+        db_order = Order.objects.get(id=order_id)
+        remote_order = client.get_order(
+            symbol=market_cache.get(db_order.market_id).tabdeal_symbol,
+            order_id=db_order.remote_id
+        )
+        db_order.apply_remote_state(self.remote_order_state(remote_order))
+        db_order.save(update_fields=["state", "filled_amount", "updated"])
+
+    def get_orders_state(self, market, remote_ids) -> dict:
+        client = self.get_client()
+        symbol = market_cache.get(market.id).tabdeal_symbol
+        remote_orders = {int(remote_order['orderId']): remote_order
+                         for remote_order in client.get_open_orders(symbol=symbol)}
+        # an order that left the open orders changed, each of them is asked for on its own so
+        # the cost follows the number of changed orders and not the size of the history
+        for remote_id in set(remote_ids) - remote_orders.keys():
+            try:
+                remote_orders[remote_id] = client.get_order(symbol=symbol, order_id=remote_id)
+            except ClientException as exception:
+                logger.warning("order %s is unknown to the exchange: %s", remote_id, exception)
+        return {remote_id: self.remote_order_state(remote_orders[remote_id])
+                for remote_id in remote_ids if remote_id in remote_orders}
+
+    def cancel_order(self, market, remote_id: int) -> RemoteOrderState:
+        client = self.get_client()
+        remote_order = client.cancel_order(symbol=market_cache.get(market.id).tabdeal_symbol, order_id=remote_id)
+        return self.remote_order_state(remote_order)
+
+    def cancel_open_orders(self, market) -> dict:
+        client = self.get_client()
+        remote_orders = client.cancel_open_orders(symbol=market_cache.get(market.id).tabdeal_symbol)
+        return {int(remote_order['orderId']): self.remote_order_state(remote_order)
+                for remote_order in remote_orders}
+
+    def find_order(self, market, client_order_id: str) -> Optional[int]:
+        client = self.get_client()
+        try:
+            remote_order = client.get_order(symbol=market_cache.get(market.id).tabdeal_symbol,
+                                            client_order_id=client_order_id)
+        except ClientException as exception:
+            # rate limits and the like say nothing about the order
+            if classify_error(exception).retryable:
+                raise
+            return None
+        return int(remote_order['orderId'])
+
+    def get_last_price(self, market) -> Optional[Decimal]:
+        client = self.get_client()
+        trades = client.trades(symbol=market_cache.get(market.id).tabdeal_symbol, limit=1)
+        return Decimal(str(trades[-1]['price'])) if trades else None
+
+    def open_stream(self, symbols=()) -> ExchangeStream:
+        client = self.get_client()
+        listen_key = client.new_listen_key()['listenKey']
+        return ExchangeStream(
+            url=f"{settings.TABDEAL_STREAM_URL}?streams={listen_key}",
+            exchange_interface=self,
+            subscribe_payload={
+                "method": "SUBSCRIBE",
+                "id": 1,
+                "params": [f"{symbol.lower()}@trade" for symbol in symbols]
+            } if symbols else None,
+            keepalive=lambda: client.renew_listen_key(listen_key)
+        )
+
+    def apply_stream_event(self, event: dict, view: StreamView) -> None:
+        event_type = event.get("e")
+        if event_type == "executionReport":
+            executed = event.get("z")
+            view.set_order_state(int(event["i"]), RemoteOrderState(
+                self.order_state(event["X"]), Decimal(str(executed)) if executed is not None else None))
+        elif event_type == "trade":
+            view.set_price(event["s"], Decimal(str(event["p"])))
+        elif event_type == "24hrTicker":
+            view.set_price(event["s"], Decimal(str(event["c"])))
+
+
+class Simulator(Tabdeal):
+    """
+    Tabdeal's behaviour on top of the in-process matching engine, for load tests that must
+    not reach the real exchange.
+    """
+
+    def get_client(self):
+        return simulated_exchange
+
+    def open_stream(self, symbols=()) -> ExchangeStream:
+        raise NotImplementedError("the simulator is polled only")
@@ -1,3 +1,774 @@
-from django.test import TestCase
+import os
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import ExitStack
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.db import connections, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from tabdeal.exceptions import ClientException, ServerException
+
+from trading_bot import models as trading_bot_models
+from trading_bot.backtest import Candle, GridBacktest, read_candles, write_binary_candles
+from trading_bot.bot_runner import BotRunner
+from trading_bot.client_pool import ClientPool
+from trading_bot.exchange_registry import exchange_providers
+from trading_bot.grid_planner import GridLevel, GridPlanner
+from trading_bot.market_cache import MarketCache, MarketInfo, market_cache
+from trading_bot.market_filters import MarketFilter, OrderFilterError
+from trading_bot.order_archive import OrderArchive
+from trading_bot.order_cancellation import OrderCanceller
+from trading_bot.order_payload import OrderPayload, OrderPayloadBuilder
+from trading_bot.order_queue import OrderQueueWorker
+from trading_bot.order_submission import OrderSubmitter
+from trading_bot.rate_limit import HIGH_PRIORITY, LOW_PRIORITY, RateLimitedClient, RateLimitGateway
+from trading_bot.retry_policy import RetryPolicy, classify_error
+from trading_bot.simulator import simulated_exchange
+from trading_bot.stream_server import LocalStreamServer
+from trading_bot.streaming import ExchangeStream, StreamView, order_streams
+
+BUY = trading_bot_models.Order.Side.Buy.value
+SELL = trading_bot_models.Order.Side.Sell.value
+
+
+def create_simulated_bot(last_price=Decimal(150), **kwargs) -> trading_bot_models.GridBot:
+    """
+    A grid bot on a BTC/USDT market of the in-process simulated exchange.
+    """
+    simulated_exchange.reset()
+    market_cache.clear()
+    simulated_exchange.add_market("BTC", "USDT", last_price=last_price)
+    exchange = trading_bot_models.Exchange.objects.create(exchange_provider=exchange_providers.id("Simulator"))
+    account = trading_bot_models.Account.objects.create(exchange=exchange, api_key="key", api_secret="secret")
+    exchange.get_and_update_markets()
+    fields = dict(investment=Decimal(1000), no_grid_lines=10, lower_price=Decimal(100), upper_price=Decimal(200))
+    fields.update(kwargs)
+    return trading_bot_models.GridBot.objects.create(account=account, market=exchange.markets.get(), **fields)
+
+
+def submit_bot_orders(grid_bot):
+    OrderSubmitter(rate=10_000, burst=10_000).submit(grid_bot.bot_orders.all())
+
+
+def order_levels(orders) -> list:
+    return sorted((order.side, order.price, order.amount) for order in orders)
+
+
+class ExchangeTests(SimpleTestCase):
+    def test_str_falls_back_to_the_id_of_an_unregistered_provider(self):
+        simulator = trading_bot_models.Exchange(exchange_provider=exchange_providers.id("Simulator"))
+        self.assertEqual(str(simulator), "Simulator")
+        self.assertEqual(str(trading_bot_models.Exchange(exchange_provider=99)), "99")
+
+
+class OrderReconciliationTests(TestCase):
+
+    def setUp(self):
+        self.grid_bot = create_simulated_bot()
+        self.grid_bot.create_orders(current_price=Decimal(150))
+        submit_bot_orders(self.grid_bot)
+
+    def test_only_orders_that_left_the_open_orders_are_looked_up(self):
+        simulated_exchange.move_price("BTCUSDT", 140)
+        with mock.patch.object(simulated_exchange, "get_order", wraps=simulated_exchange.get_order) as get_order, \
+                mock.patch.object(simulated_exchange, "get_orders") as get_orders:
+            changed_orders = trading_bot_models.Order.fetch_orders_state(self.grid_bot.bot_orders.all())
+        filled_order = self.grid_bot.bot_orders.get(price=140)
+        self.assertEqual([order.id for order in changed_orders], [filled_order.id])
+        self.assertEqual(changed_orders[0].state, trading_bot_models.Order.State.Filled.value)
+        get_order.assert_called_once_with(symbol=mock.ANY, order_id=filled_order.remote_id)
+        get_orders.assert_not_called()
+
+    def test_unchanged_orders_cost_one_open_orders_query(self):
+        with mock.patch.object(simulated_exchange, "get_order") as get_order:
+            self.assertEqual(trading_bot_models.Order.fetch_orders_state(self.grid_bot.bot_orders.all()), [])
+        get_order.assert_not_called()
+
+
+class ClientPoolTests(SimpleTestCase):
+
+    def test_least_recently_used_client_is_evicted_and_closed(self):
+        pool = ClientPool(max_size=2)
+        clients = {key: mock.Mock() for key in "abc"}
+        for key in "aba":
+            pool.get_client(key, lambda: clients[key])
+        pool.get_client("c", lambda: clients["c"])
+        clients["b"].session.close.assert_called_once_with()
+        clients["a"].session.close.assert_not_called()
+        self.assertIs(pool.get_client("a", mock.Mock), clients["a"])
+        self.assertEqual((pool.hits, pool.misses, pool.evictions), (2, 3, 1))
+
+    def test_idle_clients_are_rebuilt(self):
+        pool = ClientPool(idle_timeout=300)
+        first_client, second_client = mock.Mock(), mock.Mock()
+        with mock.patch("trading_bot.client_pool.time.monotonic", side_effect=[0, 200, 501]):
+            self.assertIs(pool.get_client("a", lambda: first_client), first_client)
+            self.assertIs(pool.get_client("a", lambda: second_client), first_client)
+            self.assertIs(pool.get_client("a", lambda: second_client), second_client)
+        first_client.session.close.assert_called_once_with()
+
+    def test_changed_credentials_get_another_client(self):
+        self.assertNotEqual(ClientPool.make_key("Tabdeal", "key", "secret"),
+                            ClientPool.make_key("Tabdeal", "key", "rotated"))
+
+
+class MarketSyncTests(TestCase):
+
+    def setUp(self):
+        self.exchange = create_simulated_bot().account.exchange
+
+    def test_unchanged_markets_are_skipped_by_their_hash(self):
+        with self.assertNumQueries(0):
+            self.exchange.get_and_update_markets()
+
+    def test_delisted_markets_are_detached(self):
+        simulated_exchange.add_market("ETH", "USDT")
+        self.exchange.get_and_update_markets()
+        self.assertEqual(sorted(str(market) for market in self.exchange.markets.all()), ["BTC@USDT", "ETH@USDT"])
+        del simulated_exchange.markets["ETHUSDT"]
+        self.exchange.get_and_update_markets()
+        self.assertEqual([str(market) for market in self.exchange.markets.all()], ["BTC@USDT"])
+        self.assertEqual(trading_bot_models.Market.objects.count(), 2)
+
+    def test_changed_filters_update_the_market_and_precision(self):
+        simulated_exchange.markets["BTCUSDT"]["filters"] = [
+            {"filterType": "PRICE_FILTER", "tickSize": "0.05"},
+            {"filterType": "LOT_SIZE", "stepSize": "0.001"},
+        ]
+        self.exchange.get_and_update_markets()
+        market = self.exchange.markets.get()
+        self.assertEqual((market.tick_size, market.step_size), (Decimal("0.05"), Decimal("0.001")))
+        self.assertEqual(market.first_currency.precision, 3)
+
+
+class MarketCacheTests(TestCase):
+
+    def setUp(self):
+        self.market = create_simulated_bot().market
+
+    def change_elsewhere(self, tick_size: Decimal):
+        # a queryset update sends no signal, like a change made by another process
+        trading_bot_models.Market.objects.filter(id=self.market.id).update(
+            tick_size=tick_size, updated=timezone.now() + timedelta(seconds=1))
+
+    def test_changes_made_by_other_processes_are_picked_up_after_the_check_interval(self):
+        cache = MarketCache(check_interval=0)
+        self.assertEqual(cache.get(self.market.id).tick_size, Decimal("0.01"))
+        self.change_elsewhere(Decimal("0.05"))
+        self.assertEqual(cache.get(self.market.id).tick_size, Decimal("0.05"))
+        with self.assertNumQueries(1):
+            cache.get(self.market.id)
+
+    def test_cache_is_not_checked_within_the_interval(self):
+        cache = MarketCache(check_interval=60)
+        cache.get(self.market.id)
+        self.change_elsewhere(Decimal("0.05"))
+        with self.assertNumQueries(0):
+            self.assertEqual(cache.get(self.market.id).tick_size, Decimal("0.01"))
+
+
+class MarketFilterTests(SimpleTestCase):
+    def setUp(self):
+        self.market_filter = MarketFilter(tick_size=Decimal("0.05"), step_size=Decimal("0.001"),
+                                          min_notional=Decimal(10))
+
+    def test_sells_round_up_and_buys_round_down_to_the_tick(self):
+        self.assertEqual(self.market_filter.apply(Decimal("100.02"), Decimal("0.5"), sell=True), (10005, 500))
+        self.assertEqual(self.market_filter.apply(Decimal("100.07"), Decimal("0.5"), sell=False), (10005, 500))
+        self.assertEqual(self.market_filter.apply(Decimal("100.05"), Decimal("0.5"), sell=True), (10005, 500))
+
+    def test_quantities_round_down_to_the_step(self):
+        self.assertEqual(self.market_filter.apply(Decimal(100), Decimal("0.1239"), sell=True), (10000, 123))
+
+    def test_rejects_orders_the_exchange_would(self):
+        for price, amount, code in [
+            (Decimal("0.04"), Decimal(1000), "price_below_tick"),
+            (Decimal(100), Decimal("0.0009"), "quantity_below_step"),
+            (Decimal(100), Decimal("0.099"), "notional_below_minimum"),
+        ]:
+            with self.assertRaises(OrderFilterError) as raised:
+                self.market_filter.apply(price, amount, sell=False)
+            self.assertEqual(raised.exception.code, code)
+        # the minimum notional is checked after snapping
+        market_filter = MarketFilter(tick_size=Decimal("0.05"), step_size=Decimal("0.001"),
+                                     min_notional=Decimal("10.001"))
+        self.assertEqual(market_filter.apply(Decimal("100.01"), Decimal("0.1"), sell=True), (10005, 100))
+        with self.assertRaises(OrderFilterError):
+            market_filter.apply(Decimal("100.01"), Decimal("0.1"), sell=False)
+
+    def test_falls_back_to_the_currency_precision(self):
+        market_filter = MarketFilter.for_market(None, None, None, base_precision=4, quote_precision=2)
+        self.assertEqual((market_filter.tick_size, market_filter.step_size), (Decimal("0.01"), Decimal("0.0001")))
+
+
+class OrderPayloadTests(SimpleTestCase):
+    def setUp(self):
+        market_filter = MarketFilter(tick_size=Decimal("0.05"), step_size=Decimal("0.001"), min_notional=Decimal(10))
+        self.builder = OrderPayloadBuilder(markets={
+            7: MarketInfo(7, "BTCUSDT", "BTC_USDT", 3, 2, market_filter.tick_size, market_filter.step_size,
+                          market_filter.min_notional_size, market_filter),
+        })
+
+    def test_build_values(self):
+        self.assertEqual(self.builder.build_values(5, 7, SELL, Decimal("100.02"), Decimal("0.1239")),
+                         OrderPayload("BTCUSDT", "SELL", "LIMIT", "0.123", "100.05", "grid-5"))
+        # floats read with values() are converted through their shortest repr
+        self.assertEqual(self.builder.build_values(None, 7, BUY, 100.07, 0.2),
+                         OrderPayload("BTCUSDT", "BUY", "LIMIT", "0.200", "100.05", None))
+
+    def test_rejected_rows_are_none(self):
+        rows = [
+            {"id": 1, "market_id": 7, "side": BUY, "price": Decimal(100), "amount": Decimal("0.5")},
+            {"id": 2, "market_id": 7, "side": BUY, "price": Decimal(100), "amount": Decimal("0.01")},
+        ]
+        self.assertEqual(self.builder.build_rows(rows),
+                         [OrderPayload("BTCUSDT", "BUY", "LIMIT", "0.500", "100.00", "grid-1"), None])
+        with self.assertRaises(OrderFilterError):
+            self.builder.build_row(rows[1])
+
+
+class GridPlannerTests(SimpleTestCase):
+
+    def planner(self, **kwargs):
+        fields = dict(lower_price=Decimal(100), upper_price=Decimal(200), no_grid_lines=10, investment=Decimal(1000),
+                      tick_size=Decimal("0.01"), step_size=Decimal("0.001"))
+        fields.update(kwargs)
+        return GridPlanner(**fields)
+
+    def test_plan_buys_below_the_price_and_leaves_the_nearest_level_empty(self):
+        self.assertEqual(self.planner().plan(current_price=Decimal(151)), [
+            GridLevel(BUY, Decimal(100), Decimal("2.000")),
+            GridLevel(BUY, Decimal(110), Decimal("1.818")),
+            GridLevel(BUY, Decimal(120), Decimal("1.666")),
+            GridLevel(BUY, Decimal(130), Decimal("1.538")),
+            GridLevel(BUY, Decimal(140), Decimal("1.428")),
+        ])
+
+    def test_plan_never_spends_more_than_the_investment(self):
+        for current_price in (Decimal(101), Decimal(155), Decimal(199), Decimal(250)):
+            levels = self.planner(geometric=True).plan(current_price=current_price)
+            self.assertLessEqual(sum(level.price * level.amount for level in levels), Decimal(1000))
+            self.assertTrue(all(level.side == BUY and level.price < current_price for level in levels))
+
+    def test_plan_skips_levels_below_the_min_notional(self):
+        self.assertEqual(self.planner(min_notional=Decimal(201)).plan(current_price=Decimal(151)), [])
+
+    def test_counter_level_is_one_level_away(self):
+        planner = self.planner()
+        self.assertEqual(planner.counter_level(BUY, Decimal(140), Decimal("1.4285"), BUY, SELL),
+                         GridLevel(SELL, Decimal(150), Decimal("1.428")))
+        self.assertEqual(planner.counter_level(SELL, Decimal(200), Decimal(1), BUY, SELL),
+                         GridLevel(BUY, Decimal(190), Decimal(1)))
+        self.assertIsNone(planner.counter_level(BUY, Decimal(200), Decimal(1), BUY, SELL))
+        self.assertIsNone(planner.counter_level(SELL, Decimal(100), Decimal(1), BUY, SELL))
+
+    def test_counter_levels_skip_occupied_levels(self):
+        occupied_prices = {Decimal(150)}
+        levels = self.planner().counter_levels(
+            [(BUY, Decimal(140), Decimal(1)), (BUY, Decimal(130), Decimal(1)), (SELL, Decimal(150), Decimal(1))],
+            occupied_prices, BUY, SELL)
+        self.assertEqual(levels, [GridLevel(SELL, Decimal(140), Decimal(1))])
+        self.assertEqual(occupied_prices, {Decimal(140), Decimal(150)})
+
+    def test_lower_price_below_the_tick_size_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.planner(lower_price=Decimal("0.001"))
+
+
+
+class CreateOrdersTests(TestCase):
+
+    def test_grid_is_placed_around_the_last_traded_price(self):
+        grid_bot = create_simulated_bot(last_price=Decimal(125))
+        grid_bot.create_orders()
+        self.assertEqual(sorted(grid_bot.bot_orders.values_list("price", flat=True)), [Decimal(100), Decimal(110)])
+
+    def test_connected_stream_price_wins_over_the_exchange(self):
+        grid_bot = create_simulated_bot(last_price=Decimal(125))
+        stream = mock.Mock(connected_since=1.0, view=StreamView())
+        stream.view.set_price("BTCUSDT", Decimal(151))
+        with mock.patch("trading_bot.models.order_streams.get", return_value=stream):
+            grid_bot.create_orders()
+        self.assertEqual(grid_bot.bot_orders.count(), 5)
+        self.assertEqual(grid_bot.bot_orders.order_by("price").last().price, Decimal(140))
+
+    def test_unknown_price_places_nothing(self):
+        grid_bot = create_simulated_bot(last_price=None)
+        with self.assertRaises(ValueError):
+            grid_bot.create_orders()
+        self.assertFalse(grid_bot.bot_orders.exists())
+
+
+class GridBacktestTests(SimpleTestCase):
+
+    candles = [
+        Candle(0, 151, 151, 151, 151),
+        Candle(60, 151, 151, 139, 140),
+        Candle(120, 140, 151, 140, 151),
+    ]
+
+    def backtest(self, fee_rate: float = 0.0) -> GridBacktest:
+        planner = GridPlanner(lower_price=Decimal(100), upper_price=Decimal(200), no_grid_lines=10,
+                              investment=Decimal(1000), tick_size=Decimal("0.01"), step_size=Decimal("0.001"))
+        return GridBacktest(planner, investment=Decimal(1000), fee_rate=fee_rate)
+
+    def test_a_round_trip_realizes_one_grid_spacing(self):
+        result = self.backtest().run(self.candles)
+        self.assertEqual((result["candles"], result["buy_fills"], result["sell_fills"]), (3, 1, 1))
+        self.assertAlmostEqual(result["realized_pnl"], 14.28)
+        self.assertAlmostEqual(result["base_position"], 0)
+        self.assertAlmostEqual(result["final_equity"], 1014.28)
+
+    def test_fees_are_charged_on_every_fill(self):
+        result = self.backtest(fee_rate=0.001).run(self.candles)
+        self.assertAlmostEqual(result["fees"], 0.001 * 1.428 * (140 + 150))
+
+    def test_binary_candles_read_back_unchanged(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "candles.bin")
+            write_binary_candles(path, self.candles)
+            self.assertEqual(list(read_candles(path)), self.candles)
+
+
+class FillHandlingTests(TestCase):
+
+    def setUp(self):
+        self.grid_bot = create_simulated_bot()
+        self.grid_bot.create_orders(current_price=Decimal(150))
+        submit_bot_orders(self.grid_bot)
+
+    def cycle(self) -> list:
+        return self.grid_bot.check_and_update_order_state_and_create_new_order_if_needed()
+
+    def test_partial_fills_are_booked_and_the_counter_order_waits_for_the_rest(self):
+        simulated_exchange.move_price("BTCUSDT", 140, volume="0.5")
+        self.cycle()
+        order = self.grid_bot.bot_orders.get(price=140)
+        self.assertEqual(order.state, trading_bot_models.Order.State.PartiallyFilled.value)
+        self.assertEqual(order.filled_amount, Decimal("0.5"))
+        self.assertFalse(self.grid_bot.bot_orders.filter(side=SELL).exists())
+
+        simulated_exchange.move_price("BTCUSDT", 140)
+        self.cycle()
+        self.assertEqual(list(trading_bot_models.Trade.objects.order_by("id").values_list("amount", flat=True)),
+                         [Decimal("0.5"), Decimal("0.928571")])
+        self.assertEqual(order_levels(self.grid_bot.bot_orders.filter(side=SELL)),
+                         [(SELL, Decimal(150), Decimal("1.428571"))])
+        summary = trading_bot_models.GridBotSummary.objects.get(grid_bot=self.grid_bot)
+        self.assertEqual((summary.fill_count, summary.base_position), (2, Decimal("1.428571")))
+
+    def test_counter_order_is_not_placed_on_an_occupied_level(self):
+        buy_order = self.grid_bot.bot_orders.get(price=140)
+        trading_bot_models.Order.objects.create(
+            grid_bot=self.grid_bot, exchange=buy_order.exchange, account=buy_order.account, market=buy_order.market,
+            side=SELL, price=Decimal(150), amount=Decimal(1))
+        simulated_exchange.move_price("BTCUSDT", 140)
+        self.cycle()
+        self.assertEqual(self.grid_bot.bot_orders.filter(price=150).count(), 1)
+        self.assertEqual(trading_bot_models.Trade.objects.count(), 1)
+
+    def test_stopped_bot_books_fills_without_counter_orders(self):
+        trading_bot_models.GridBot.objects.filter(id=self.grid_bot.id).update(active=False)
+        self.grid_bot.refresh_from_db()
+        simulated_exchange.move_price("BTCUSDT", 140)
+        self.cycle()
+        self.assertEqual(trading_bot_models.Trade.objects.count(), 1)
+        self.assertFalse(self.grid_bot.bot_orders.filter(side=SELL).exists())
+
+    def test_update_orders_state_books_fills_like_the_cycle(self):
+        simulated_exchange.move_price("BTCUSDT", 140)
+        trading_bot_models.Order.update_orders_state(trading_bot_models.Order.objects.all())
+        self.assertEqual(trading_bot_models.Trade.objects.count(), 1)
+        self.assertEqual(order_levels(self.grid_bot.bot_orders.filter(side=SELL)),
+                         [(SELL, Decimal(150), Decimal("1.428571"))])
+
+    def test_orders_reconciled_concurrently_are_booked_once(self):
+        simulated_exchange.move_price("BTCUSDT", 140)
+        stale_orders = trading_bot_models.Order.fetch_orders_state(self.grid_bot.bot_orders.all())
+        trading_bot_models.Order.update_orders_state(trading_bot_models.Order.objects.all())
+        with transaction.atomic():
+            self.assertEqual(trading_bot_models.Order.save_orders_state(stale_orders), [])
+        self.assertEqual(trading_bot_models.Trade.objects.count(), 1)
+        self.assertEqual(self.grid_bot.bot_orders.filter(side=SELL).count(), 1)
+
+
+def wait_until(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out waiting for the stream")
+        time.sleep(0.01)
+
+
+class OrderStreamTests(TestCase):
+
+    def setUp(self):
+        self.grid_bot = create_simulated_bot()
+        self.grid_bot.create_orders(current_price=Decimal(150))
+        submit_bot_orders(self.grid_bot)
+        self.server = LocalStreamServer().start()
+        # reconnects wait long enough for the test to see the disconnected stream
+        self.stream = order_streams.start(self.grid_bot.account_id, ExchangeStream(
+            url=self.server.url, exchange_interface=self.grid_bot.account.exchange.exchange_interface(),
+            reconnect_delay=60))
+        wait_until(lambda: self.stream.connected)
+        # orders placed before the stream connected are polled once, which seeds the view
+        self.cycle()
+        self.order = self.grid_bot.bot_orders.get(price=140)
+
+    def tearDown(self):
+        # a stream closed from its own side waits for its ping timeout before it stops
+        self.server.disconnect_clients()
+        wait_until(lambda: not self.stream.connected)
+        order_streams.stop_all(timeout=5)
+        self.server.stop()
+
+    def cycle(self) -> list:
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.grid_bot.check_and_update_order_state_and_create_new_order_if_needed()
+
+    def test_streamed_fills_are_booked_without_polling(self):
+        self.server.publish({"e": "executionReport", "i": self.order.remote_id, "X": "FILLED",
+                             "z": str(self.order.amount)})
+        wait_until(lambda: self.stream.view.order_state(self.order.remote_id).state ==
+                   trading_bot_models.Order.State.Filled.value)
+        with mock.patch.object(simulated_exchange, "get_open_orders") as get_open_orders, \
+                mock.patch.object(simulated_exchange, "get_order") as get_order:
+            changed_orders = self.cycle()
+        get_open_orders.assert_not_called()
+        get_order.assert_not_called()
+        self.assertEqual([order.id for order in changed_orders], [self.order.id])
+        self.assertEqual(trading_bot_models.Trade.objects.get().amount, self.order.amount)
+        self.assertEqual(order_levels(self.grid_bot.bot_orders.filter(side=SELL)),
+                         [(SELL, Decimal(150), self.order.amount)])
+        # the ended order is no longer tracked, the live ones still are
+        self.assertNotIn(self.order.remote_id, self.stream.view.order_states)
+        self.assertEqual(len(self.stream.view.order_states), 4)
+
+    def test_disconnected_stream_falls_back_to_polling(self):
+        self.server.disconnect_clients()
+        wait_until(lambda: not self.stream.connected)
+        simulated_exchange.move_price("BTCUSDT", 140)
+        with mock.patch.object(simulated_exchange, "get_open_orders",
+                               wraps=simulated_exchange.get_open_orders) as get_open_orders:
+            changed_orders = self.cycle()
+        get_open_orders.assert_called_once()
+        self.assertEqual([order.id for order in changed_orders], [self.order.id])
+        self.assertEqual(trading_bot_models.Trade.objects.count(), 1)
+
+
+@override_settings(API_TOKENS=["token"])
+class SimulatedCycleTests(TestCase):
+
+    def test_a_buy_and_its_counter_sell_realize_the_grid_spacing(self):
+        grid_bot = create_simulated_bot()
+        grid_bot.create_orders(current_price=Decimal(150))
+        submit_bot_orders(grid_bot)
+        self.assertEqual({order["status"] for order in simulated_exchange.orders.values()}, {"NEW"})
+
+        simulated_exchange.move_price("BTCUSDT", 140)
+        grid_bot.check_and_update_order_state_and_create_new_order_if_needed()
+        sell_order = grid_bot.bot_orders.get(side=SELL)
+        self.assertEqual((sell_order.price, sell_order.amount), (Decimal(150), Decimal("1.428571")))
+        submit_bot_orders(grid_bot)
+
+        simulated_exchange.move_price("BTCUSDT", 150)
+        grid_bot.check_and_update_order_state_and_create_new_order_if_needed()
+        sell_order.refresh_from_db()
+        self.assertEqual(sell_order.state, trading_bot_models.Order.State.Filled.value)
+        # the sell is countered by a new buy on the level it came from
+        self.assertEqual(grid_bot.bot_orders.filter(side=BUY, price=140).count(), 2)
+
+        summary = trading_bot_models.GridBotSummary.objects.get(grid_bot=grid_bot)
+        self.assertEqual(summary.fill_count, 2)
+        self.assertEqual(summary.base_position, 0)
+        self.assertEqual(summary.realized_pnl, Decimal("14.28571") - summary.fees)
+        response = self.client.get(f"/api/bots/{grid_bot.id}", HTTP_AUTHORIZATION="Bearer token")
+        self.assertEqual(response.json()["summary"]["fill_count"], 2)
+
+
+class RetryClassificationTests(SimpleTestCase):
+
+    def test_transient_errors_are_retryable(self):
+        self.assertEqual(classify_error(requests.Timeout("read timed out"))[:3], ("timeout", None, True))
+        self.assertEqual(classify_error(requests.ConnectionError("reset"))[:3], ("connection", None, True))
+        self.assertEqual(classify_error(ServerException(503, "unavailable"))[:3], ("server_503", 503, True))
+        self.assertEqual(classify_error(ClientException(429, "too many requests", -1003))[:3],
+                         ("client_-1003", 429, True))
+
+    def test_rejections_are_fatal(self):
+        self.assertEqual(classify_error(ClientException(400, "insufficient balance", -2010))[:3],
+                         ("client_-2010", 400, False))
+        self.assertEqual(classify_error(OrderFilterError("min_notional", "too small"))[:3],
+                         ("min_notional", None, False))
+        self.assertFalse(classify_error(RuntimeError("bug")).retryable)
+
+    def test_backoff_grows_and_stops_at_max_attempts(self):
+        policy = RetryPolicy(base_delay=2, max_delay=10, max_attempts=3)
+        self.assertTrue(timedelta(seconds=1) <= policy.delay(1) <= timedelta(seconds=2))
+        self.assertTrue(timedelta(seconds=5) <= policy.delay(10) <= timedelta(seconds=10))
+        retryable = classify_error(requests.Timeout())
+        self.assertTrue(policy.should_retry(retryable, 2))
+        self.assertFalse(policy.should_retry(retryable, 3))
+
+
+class RateLimitTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def gateway(self) -> RateLimitGateway:
+        return RateLimitGateway(directory=self.directory.name, limits={"account": (10, 20), "ip": (100, 200)},
+                                reserve=0.25)
+
+    def state(self, buckets) -> list:
+        with ExitStack() as stack:
+            return buckets[1].read(buckets[1].open(stack), time.time())
+
+    def test_low_priority_requests_leave_the_reserve_to_high_priority_ones(self):
+        bucket = self.gateway().buckets("Tabdeal", "key")[1]
+        now = time.time()
+        self.assertEqual(bucket.wait_time([6, now, 0], 1, LOW_PRIORITY, now), 0)
+        self.assertAlmostEqual(bucket.wait_time([5.5, now, 0], 1, LOW_PRIORITY, now), 0.05)
+        self.assertEqual(bucket.wait_time([1, now, 0], 1, HIGH_PRIORITY, now), 0)
+
+    def test_processes_share_one_budget_per_account(self):
+        first_process, second_process = self.gateway(), self.gateway()
+        first_process.acquire(first_process.buckets("Tabdeal", "key"), weight=15, priority=HIGH_PRIORITY)
+        buckets = second_process.buckets("Tabdeal", "key")
+        self.assertLess(self.state(buckets)[0], 6)
+        self.assertGreater(self.state(second_process.buckets("Tabdeal", "other-key"))[0], 19)
+        self.assertIs(second_process.buckets("Tabdeal", "key")[1], buckets[1])
+
+    def test_rate_limit_responses_pause_every_process(self):
+        client = mock.Mock()
+        client.get_open_orders.side_effect = ClientException(429, "too many requests", -1003)
+        with self.assertRaises(ClientException):
+            RateLimitedClient(client, self.gateway(), "Tabdeal", "key").get_open_orders(symbol="BTC_USDT")
+        buckets = self.gateway().buckets("Tabdeal", "key")
+        state = self.state(buckets)
+        self.assertGreater(state[2], time.time() + 4)
+        self.assertGreater(buckets[1].wait_time(state, 1, HIGH_PRIORITY, time.time()), 4)
+
+
+class BotRunnerTests(TransactionTestCase):
+
+    def test_bots_sharing_an_account_and_market_are_reconciled_together(self):
+        grid_bot = create_simulated_bot()
+        other_bot = trading_bot_models.GridBot.objects.create(
+            account=grid_bot.account, market=grid_bot.market, investment=Decimal(1000), no_grid_lines=10,
+            lower_price=Decimal(100), upper_price=Decimal(200), cycle_interval=120)
+        for bot in (grid_bot, other_bot):
+            bot.create_orders(current_price=Decimal(150))
+        runner = BotRunner()
+        runner._refresh_bots(time.monotonic())
+        (shard, (bot_ids, cycle_interval)), = runner._shards.items()
+        self.assertEqual((bot_ids, cycle_interval), ([grid_bot.id, other_bot.id], grid_bot.cycle_interval))
+        runner._run_cycle(shard, bot_ids)
+        self.assertFalse(trading_bot_models.Order.objects.filter(
+            state=trading_bot_models.Order.State.WaitingToSubmit.value).exists())
+
+        simulated_exchange.move_price("BTCUSDT", 140)
+        with mock.patch.object(simulated_exchange, "get_open_orders",
+                               wraps=simulated_exchange.get_open_orders) as get_open_orders:
+            runner._run_cycle(shard, bot_ids)
+        get_open_orders.assert_called_once()
+        self.assertEqual(sorted(trading_bot_models.Trade.objects.values_list("order__grid_bot_id", flat=True)),
+                         [grid_bot.id, other_bot.id])
+        # the counter orders are submitted in the same cycle
+        self.assertEqual(trading_bot_models.Order.objects.filter(
+            side=SELL, state=trading_bot_models.Order.State.Waiting.value).count(), 2)
+
+
+@override_settings(API_TOKENS=["token"])
+class ReadApiTests(TestCase):
+
+    def setUp(self):
+        self.grid_bot = create_simulated_bot()
+        for _ in range(2):
+            trading_bot_models.GridBot.objects.create(
+                account=self.grid_bot.account, market=self.grid_bot.market, investment=Decimal(1000),
+                no_grid_lines=10, lower_price=Decimal(100), upper_price=Decimal(200))
+
+    def get(self, path, **headers):
+        return self.client.get(path, HTTP_AUTHORIZATION="Bearer token", **headers)
+
+    def test_lists_are_keyset_paginated(self):
+        first_page = self.get("/api/bots?limit=2").json()
+        self.assertEqual(len(first_page["results"]), 2)
+        second_page = self.get(first_page["next"]).json()
+        self.assertEqual(len(second_page["results"]), 1)
+        self.assertIsNone(second_page["next"])
+        self.assertEqual([bot["id"] for bot in first_page["results"] + second_page["results"]],
+                         list(trading_bot_models.GridBot.objects.order_by("id").values_list("id", flat=True)))
+
+    def test_unchanged_resources_answer_not_modified(self):
+        response = self.get(f"/api/bots/{self.grid_bot.id}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get(f"/api/bots/{self.grid_bot.id}", HTTP_IF_NONE_MATCH=response["ETag"]).status_code,
+                         304)
+        # submitted orders are open orders of the bot
+        self.grid_bot.create_orders(current_price=Decimal(150))
+        submit_bot_orders(self.grid_bot)
+        response = self.get(f"/api/bots/{self.grid_bot.id}", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual((response.status_code, response.json()["open_orders"]), (200, 5))
+        # and so are orders that fill
+        simulated_exchange.move_price("BTCUSDT", 140)
+        self.grid_bot.check_and_update_order_state_and_create_new_order_if_needed()
+        self.assertEqual(self.get(f"/api/bots/{self.grid_bot.id}", HTTP_IF_NONE_MATCH=response["ETag"]).status_code,
+                         200)
+
+    def test_revalidation_does_not_read_the_orders(self):
+        self.grid_bot.create_orders(current_price=Decimal(150))
+        submit_bot_orders(self.grid_bot)
+        response = self.get("/api/bots")
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get("/api/bots", HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+    def test_anonymous_callers_are_rejected(self):
+        self.assertEqual(self.client.get("/api/bots").status_code, 401)
+        self.assertEqual(self.client.get("/api/fills", HTTP_AUTHORIZATION="Bearer wrong").status_code, 401)
+
+
+class CancellationTests(TransactionTestCase):
+
+    def setUp(self):
+        self.grid_bot = create_simulated_bot()
+        self.grid_bot.create_orders(current_price=Decimal(150))
+        submit_bot_orders(self.grid_bot)
+        buy_order = self.grid_bot.bot_orders.first()
+        self.local_order = trading_bot_models.Order.objects.create(
+            grid_bot=self.grid_bot, exchange=buy_order.exchange, account=buy_order.account, market=buy_order.market,
+            side=BUY, price=Decimal(105), amount=Decimal(1))
+
+    def test_deactivate_cancels_every_order(self):
+        report, = OrderCanceller(cancel_all=False).deactivate(
+            trading_bot_models.GridBot.objects.filter(id=self.grid_bot.id))
+        self.assertEqual((report.canceled, report.filled, report.still_open), (6, 0, 0))
+        self.assertFalse(trading_bot_models.GridBot.objects.get(id=self.grid_bot.id).active)
+        self.assertEqual(set(self.grid_bot.bot_orders.values_list("state", flat=True)),
+                         {trading_bot_models.Order.State.Canceled.value})
+        self.assertEqual({order["status"] for order in simulated_exchange.orders.values()}, {"CANCELED"})
+
+    def test_fills_found_while_cancelling_are_booked(self):
+        simulated_exchange.move_price("BTCUSDT", 140)
+        report, = OrderCanceller(cancel_all=True).deactivate(
+            trading_bot_models.GridBot.objects.filter(id=self.grid_bot.id))
+        self.assertEqual((report.canceled, report.filled, report.still_open), (5, 1, 0))
+        self.assertEqual(trading_bot_models.Trade.objects.count(), 1)
+        self.assertFalse(self.grid_bot.bot_orders.filter(side=SELL).exists())
+
+    def test_orders_cancelled_after_a_partial_fill_are_counted(self):
+        buy_order = self.grid_bot.bot_orders.get(side=BUY, price=Decimal(140))
+        simulated_exchange.move_price("BTCUSDT", 140, volume=buy_order.amount / 2)
+        report, = OrderCanceller(cancel_all=False).deactivate(
+            trading_bot_models.GridBot.objects.filter(id=self.grid_bot.id))
+        self.assertEqual((report.canceled, report.filled, report.partially_filled, report.still_open), (5, 0, 1, 0))
+        buy_order.refresh_from_db()
+        self.assertEqual((buy_order.state, buy_order.filled_amount),
+                         (trading_bot_models.Order.State.PartiallyFilledAndFinished.value, buy_order.amount / 2))
+        self.assertEqual(trading_bot_models.Trade.objects.get().amount, buy_order.amount / 2)
+
+
+
+class OrderArchiveTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.archive = OrderArchive(directory=self.directory.name, age=timedelta(days=30))
+        grid_bot = create_simulated_bot()
+        grid_bot.create_orders(current_price=Decimal(150))
+        submit_bot_orders(grid_bot)
+        simulated_exchange.move_price("BTCUSDT", 140)
+        grid_bot.check_and_update_order_state_and_create_new_order_if_needed()
+        grid_bot.bot_orders.filter(state=trading_bot_models.Order.State.Waiting.value).update(
+            state=trading_bot_models.Order.State.Canceled.value)
+        self.old = timezone.now() - timedelta(days=60)
+        grid_bot.bot_orders.exclude(state=trading_bot_models.Order.State.WaitingToSubmit.value).update(
+            updated=self.old)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_archived_orders_and_trades_read_back_unchanged(self):
+        terminal_orders = {order.id: order for order in trading_bot_models.Order.objects.exclude(
+            state=trading_bot_models.Order.State.WaitingToSubmit.value)}
+        trade = trading_bot_models.Trade.objects.get()
+        self.assertEqual(self.archive.archive(), len(terminal_orders))
+
+        self.assertEqual(list(trading_bot_models.Order.objects.values_list("state", flat=True)),
+                         [trading_bot_models.Order.State.WaitingToSubmit.value])
+        self.assertFalse(trading_bot_models.Trade.objects.exists())
+        rows = list(self.archive.read("orders"))
+        self.assertEqual(sorted(row["id"] for row in rows), sorted(terminal_orders))
+        for row in rows:
+            order = terminal_orders[row["id"]]
+            self.assertEqual((row["price"], row["amount"], row["state"], row["remote_id"], row["updated"]),
+                             (order.price, order.amount, order.state, order.remote_id, self.old))
+        trade_row, = self.archive.read("trades")
+        self.assertEqual((trade_row["order_id"], trade_row["amount"], trade_row["fee"]),
+                         (trade.order_id, trade.amount, trade.fee))
+
+    def test_rows_archived_twice_are_read_once(self):
+        orders = list(trading_bot_models.Order.objects.filter(state=trading_bot_models.Order.State.Canceled.value))
+        self.archive.write("orders", orders)
+        self.archive.write("orders", orders)
+        month = f"{self.old:%Y-%m}"
+        self.assertEqual(len(list(self.archive.read("orders", start_month=month, end_month=month))), len(orders))
+        self.assertEqual(list(self.archive.read("orders", start_month="2999-01")), [])
+
+
+@unittest.skipUnless(os.environ.get("POSTGRES_DB"), "SKIP LOCKED needs PostgreSQL, set POSTGRES_DB")
+class OrderQueueWorkerTests(TransactionTestCase):
+
+    def test_concurrent_workers_submit_every_order_once(self):
+        grid_bot = create_simulated_bot()
+        stopped_bot = trading_bot_models.GridBot.objects.create(
+            account=grid_bot.account, market=grid_bot.market, investment=Decimal(1000), no_grid_lines=10,
+            lower_price=Decimal(100), upper_price=Decimal(200), active=False)
+        orders = [
+            trading_bot_models.Order(grid_bot=bot, exchange=grid_bot.account.exchange, account=grid_bot.account,
+                                     market=grid_bot.market, side=trading_bot_models.Order.Side.Buy.value,
+                                     price=Decimal(100) + index % 40, amount=Decimal("0.01"))
+            for index in range(200) for bot in (grid_bot, stopped_bot)
+        ]
+        trading_bot_models.Order.objects.bulk_create(orders)
+
+        submitted = []
+        submitted_lock = threading.Lock()
+
+        class RecordingSubmitter(OrderSubmitter):
+            def _send(self, order, payload):
+                with submitted_lock:
+                    submitted.append(order.id)
+                return super()._send(order, payload)
+
+        start = threading.Barrier(2)
+
+        def work():
+            worker = OrderQueueWorker(batch_size=7, submitter=RecordingSubmitter(rate=10_000, burst=10_000))
+            try:
+                start.wait()
+                while worker.claim_and_submit():
+                    pass
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=work) for _ in range(2)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(len(submitted), len(set(submitted)))
+        self.assertCountEqual(submitted, grid_bot.bot_orders.values_list("id", flat=True))
+        self.assertFalse(grid_bot.bot_orders.filter(remote_id__isnull=True).exists())
+        self.assertEqual(stopped_bot.bot_orders.filter(
+            state=trading_bot_models.Order.State.WaitingToSubmit.value).count(), 200)
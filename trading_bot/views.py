@@ -1,3 +1,254 @@
-from django.shortcuts import render
+import functools
+import hashlib
+import hmac
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseNotAllowed, \
+    HttpResponseNotModified, JsonResponse
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+
+from trading_bot import models as trading_bot_models
+from trading_bot.metrics import metrics as metrics_registry, metrics_allowed
+
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 500
+
+
+def metrics(request):
+    # only this web process's metrics, the daemons serve theirs with --metrics-port
+    if not (request.user.is_staff or metrics_allowed(request.META.get("REMOTE_ADDR", ""))):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics_registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# Read API. Lists are keyset paginated on id: ``?after=<last id>&limit=<n>``, every response
+# carries an ETag and Last-Modified derived from the newest ``updated`` and the row count of
+# what it covers, so a poller revalidating an unchanged resource costs one aggregate query.
+# Callers need a staff session or an ``Authorization: Bearer <token>`` header with one of
+# the API_TOKENS.
+
+def api_auth(view):
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not await is_api_caller(request):
+            response = JsonResponse({"detail": "authentication required"}, status=401)
+            response["WWW-Authenticate"] = "Bearer"
+            return response
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+async def is_api_caller(request) -> bool:
+    scheme, _, token = request.META.get("HTTP_AUTHORIZATION", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        return any(hmac.compare_digest(token.encode(), api_token.encode())
+                   for api_token in getattr(settings, "API_TOKENS", []))
+    # the session and user lookups are synchronous
+    return await sync_to_async(lambda: request.user.is_staff)()
+
+
+@api_auth
+async def bots(request):
+    if request.method not in ("GET", "HEAD"):
+        return HttpResponseNotAllowed(["GET", "HEAD"])
+    try:
+        after, limit = page_params(request)
+    except ValueError:
+        return HttpResponseBadRequest("after and limit must be positive integers")
+    queryset = trading_bot_models.GridBot.objects.all()
+    if "active" in request.GET:
+        queryset = queryset.filter(active=request.GET["active"] not in ("0", "false"))
+
+    etag, last_modified, not_modified = await check_bots_modified(request, queryset)
+    if not_modified is not None:
+        return not_modified
+    rows = [bot_data(bot) async for bot in bots_queryset(queryset.filter(id__gt=after))[:limit + 1]]
+    return page_response(request, rows, limit, etag, last_modified)
+
+
+@api_auth
+async def bot(request, bot_id: int):
+    if request.method not in ("GET", "HEAD"):
+        return HttpResponseNotAllowed(["GET", "HEAD"])
+    queryset = trading_bot_models.GridBot.objects.filter(id=bot_id)
+    etag, last_modified, not_modified = await check_bots_modified(request, queryset)
+    if not_modified is not None:
+        return not_modified
+    grid_bot = await bots_queryset(queryset).afirst()
+    if grid_bot is None:
+        return JsonResponse({"detail": "not found"}, status=404)
+    return json_response(bot_data(grid_bot), etag, last_modified)
+
+
+@api_auth
+async def open_orders(request):
+    if request.method not in ("GET", "HEAD"):
+        return HttpResponseNotAllowed(["GET", "HEAD"])
+    try:
+        after, limit = page_params(request)
+        bot_id = int(request.GET["bot"]) if "bot" in request.GET else None
+    except ValueError:
+        return HttpResponseBadRequest("after, limit and bot must be positive integers")
+    queryset = trading_bot_models.Order.objects.filter(state__in=trading_bot_models.Order.State.active_states())
+    if bot_id is not None:
+        queryset = queryset.filter(grid_bot_id=bot_id)
+
+    validators = await queryset.aaggregate(last_modified=Max("updated"), count=Count("id"))
+    etag, last_modified, not_modified = check_modified(request, validators["last_modified"], validators["count"])
+    if not_modified is not None:
+        return not_modified
+    rows = [order_data(order) async for order in queryset.filter(id__gt=after).select_related(
+        "market__first_currency", "market__second_currency").order_by("id")[:limit + 1]]
+    return page_response(request, rows, limit, etag, last_modified)
+
+
+@api_auth
+async def fills(request):
+    if request.method not in ("GET", "HEAD"):
+        return HttpResponseNotAllowed(["GET", "HEAD"])
+    try:
+        after, limit = page_params(request)
+        bot_id = int(request.GET["bot"]) if "bot" in request.GET else None
+    except ValueError:
+        return HttpResponseBadRequest("after, limit and bot must be positive integers")
+    queryset = trading_bot_models.Trade.objects.all()
+    if bot_id is not None:
+        queryset = queryset.filter(order__grid_bot_id=bot_id)
+
+    validators = await queryset.aaggregate(last_modified=Max("updated"), count=Count("id"))
+    etag, last_modified, not_modified = check_modified(request, validators["last_modified"], validators["count"])
+    if not_modified is not None:
+        return not_modified
+    rows = [trade_data(trade) async for trade in queryset.filter(id__gt=after).select_related(
+        "order__market__first_currency", "order__market__second_currency").order_by("id")[:limit + 1]]
+    return page_response(request, rows, limit, etag, last_modified)
+
+
+def page_params(request) -> tuple:
+    after = int(request.GET.get("after", 0))
+    limit = min(int(request.GET.get("limit", API_PAGE_SIZE)), API_MAX_PAGE_SIZE)
+    if after < 0 or limit < 1:
+        raise ValueError
+    return after, limit
+
+
+def bots_queryset(queryset):
+    return queryset.select_related(
+        "market__first_currency", "market__second_currency", "summary"
+    ).annotate(
+        open_orders=Count("bot_orders", filter=Q(bot_orders__state__in=trading_bot_models.Order.State.active_states()))
+    ).order_by("id")
+
+
+async def check_bots_modified(request, queryset) -> tuple:
+    # a bot's status also changes with its summary, and with its orders which bump the bot's updated
+    validators = await queryset.aaggregate(bot_updated=Max("updated"), summary_updated=Max("summary__updated"),
+                                           count=Count("id"))
+    last_modified = max((value for value in (validators["bot_updated"], validators["summary_updated"])
+                         if value is not None), default=None)
+    return check_modified(request, last_modified, validators["count"])
+
+
+def check_modified(request, last_modified, count: int) -> tuple:
+    """
+    Returns the ETag and Last-Modified of the resource and a 304 response when the
+    request's validators show the client already has it.
+    """
+    fingerprint = f"{request.get_full_path()}|{last_modified.isoformat() if last_modified else ''}|{count}"
+    etag = quote_etag(hashlib.sha1(fingerprint.encode()).hexdigest()[:20])
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if_modified_since = parse_http_date_safe(request.META.get("HTTP_IF_MODIFIED_SINCE", ""))
+    if if_none_match is not None:
+        etags = parse_etags(if_none_match)
+        not_modified = "*" in etags or etag in etags
+    else:
+        not_modified = if_modified_since is not None and last_modified is not None and \
+            int(last_modified.timestamp()) <= if_modified_since
+    if not not_modified:
+        return etag, last_modified, None
+    response = HttpResponseNotModified()
+    set_validators(response, etag, last_modified)
+    return etag, last_modified, response
+
+
+def set_validators(response, etag: str, last_modified):
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    response["Cache-Control"] = "no-cache"
+
+
+def json_response(data, etag: str, last_modified) -> JsonResponse:
+    response = JsonResponse(data, safe=False)
+    set_validators(response, etag, last_modified)
+    return response
+
+
+def page_response(request, rows: list, limit: int, etag: str, last_modified) -> JsonResponse:
+    next_url = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        query = request.GET.copy()
+        query["after"] = rows[-1]["id"]
+        next_url = f"{request.path}?{query.urlencode()}"
+    return json_response({"results": rows, "next": next_url}, etag, last_modified)
+
+
+def market_symbol(market) -> str:
+    return f"{market.first_currency.symbol}{market.second_currency.symbol}"
+
+
+def bot_data(grid_bot) -> dict:
+    summary = getattr(grid_bot, "summary", None)
+    return {
+        "id": grid_bot.id,
+        "account": grid_bot.account_id,
+        "market": market_symbol(grid_bot.market),
+        "active": grid_bot.active,
+        "investment": grid_bot.investment,
+        "lower_price": grid_bot.lower_price,
+        "upper_price": grid_bot.upper_price,
+        "no_grid_lines": grid_bot.no_grid_lines,
+        "spacing": trading_bot_models.GridBot.Spacing(grid_bot.spacing).label,
+        "open_orders": grid_bot.open_orders,
+        "summary": {
+            "realized_pnl": summary.realized_pnl,
+            "average_entry_price": summary.average_entry_price,
+            "base_position": summary.base_position,
+            "quote_position": summary.quote_position,
+            "fees": summary.fees,
+            "fill_count": summary.fill_count,
+        } if summary is not None else None,
+        "updated": grid_bot.updated,
+    }
+
+
+def order_data(order) -> dict:
+    return {
+        "id": order.id,
+        "bot": order.grid_bot_id,
+        "market": market_symbol(order.market),
+        "side": trading_bot_models.Order.Side(order.side).label,
+        "price": order.price,
+        "amount": order.amount,
+        "state": trading_bot_models.Order.State(order.state).label,
+        "remote_id": order.remote_id,
+        "created": order.created,
+        "updated": order.updated,
+    }
+
+
+def trade_data(trade) -> dict:
+    return {
+        "id": trade.id,
+        "order": trade.order_id,
+        "bot": trade.order.grid_bot_id,
+        "market": market_symbol(trade.order.market),
+        "side": trading_bot_models.Order.Side(trade.order.side).label,
+        "price": trade.price,
+        "amount": trade.amount,
+        "fee": trade.fee,
+        "executed_at": trade.executed_at,
+    }